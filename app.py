@@ -5,19 +5,39 @@ Main application file that handles routing and API endpoints.
 This module provides the following functionality:
 - File upload and processing
 - Transaction data retrieval with filtering
-- Summary statistics calculation
+- Summary statistics calculation (exact, or approximate from stored sketches)
+- A single dashboard endpoint that runs the summary and transaction queries concurrently
+- A server-sent events stream that pushes ingest progress and data changes to dashboards
 - API endpoints for frontend interaction
 """
 
 import os
 import logging
-from flask import Flask, render_template, jsonify, request, flash, redirect, url_for
+import gzip
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, jsonify, request, flash, redirect, url_for
 from werkzeug.utils import secure_filename
 import mysql.connector
+from mysql.connector import pooling
 from dotenv import load_dotenv
-from scripts.process_data import process_xml_file
+from scripts.process_data import (
+    acquire_reload_lock, create_shadow_tables, process_xml_file, release_reload_lock, swap_shadow_tables
+)
+from scripts.records import (
+    TRANSACTION_FIELDS, Transaction, dump_transactions, parse_fields, write_transaction_columns, write_transactions
+)
+from scripts.sketches import load_merged_sketch
+from scripts.events import EventBroker
 from flask_cors import CORS
 
+# Brotli is optional; without it responses are gzip-compressed only
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # Set up logging so we can track what happens in the app.
 # This helps with debugging and understanding user actions.
 logging.basicConfig(
@@ -40,6 +60,15 @@ ALLOWED_EXTENSIONS = {'xml'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # Default 16MB
 
+# Response compression: JSON responses at least this many bytes long are
+# compressed with brotli or gzip when the client's Accept-Encoding allows it
+COMPRESSION_MIN_SIZE = 1024
+
+# Batch lookup configuration: how many IDs one request may contain,
+# and how many go into each IN (...) query
+MAX_LOOKUP_IDS = int(os.getenv('MAX_LOOKUP_IDS', 10000))
+LOOKUP_BATCH_SIZE = 500
+
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
@@ -51,6 +80,22 @@ db_config = {
     'database': os.getenv('DB_NAME', 'momo_analysis')
 }
 
+# Connection pool configuration. The pool is created on first use so the app
+# can start before MySQL is ready. The dashboard executor runs one query per
+# pooled connection and has as many workers as the pool has connections, but the
+# other endpoints (transactions, summary, lookup, truncate) share the same pool,
+# so get_db_connection opens a direct connection when the pool is exhausted.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+db_pool = None
+db_pool_lock = threading.Lock()
+dashboard_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix='dashboard')
+
+# Server-sent events: connected dashboards are notified about ingest progress and data changes.
+# A comment line is sent every SSE_HEARTBEAT_SECONDS so idle connections stay open
+# and closed ones are noticed.
+SSE_HEARTBEAT_SECONDS = 15
+event_broker = EventBroker()
+
 def allowed_file(filename):
     """
     Returns True if the uploaded file has an allowed extension (e.g., .xml).
@@ -60,17 +105,41 @@ def allowed_file(filename):
 
 def get_db_connection():
     """
-    Create and return a database connection using the configuration from the .env file.
+    Return a database connection from the shared pool, using the configuration from the .env file.
+    Closing the connection hands it back to the pool. If every pooled connection is
+    busy, a regular connection is opened instead so the request doesn't fail.
     If the connection fails, an error is logged and the exception is raised.
     """
+    global db_pool
     try:
-        connection = mysql.connector.connect(**db_config)
+        with db_pool_lock:
+            if db_pool is None:
+                db_pool = pooling.MySQLConnectionPool(pool_name='momo_pool', pool_size=DB_POOL_SIZE, **db_config)
+        try:
+            connection = db_pool.get_connection()
+        except mysql.connector.errors.PoolError:
+            logger.warning("Connection pool exhausted, opening a direct connection")
+            connection = mysql.connector.connect(**db_config)
         logger.info("Database connection established successfully")
         return connection
     except mysql.connector.Error as err:
         logger.error(f"Error connecting to database: {err}")
         raise
 
+def run_query(query_function, *args, dictionary=True):
+    """
+    Run query_function(cursor, *args) on its own pooled connection and return its result.
+    Used to run independent dashboard queries at the same time.
+    Pass dictionary=False for query functions that read plain tuple rows.
+    """
+    connection = get_db_connection()
+    cursor = connection.cursor(dictionary=dictionary)
+    try:
+        return query_function(cursor, *args)
+    finally:
+        cursor.close()
+        connection.close()
+
 @app.route('/')
 def index():
     """
@@ -100,15 +169,26 @@ def upload_file():
             file.save(filepath)
             logger.info(f"File saved successfully: {filepath}")
             try:
-                # Process the uploaded XML file and count processed transactions
-                processed_count = process_xml_file(filepath)
+                # Process the uploaded XML file and count processed transactions,
+                # reporting progress to any dashboards listening on /api/events
+                processed_count = process_xml_file(
+                    filepath,
+                    progress_callback=lambda processed, total: event_broker.publish('ingest_progress', {
+                        'filename': filename,
+                        'processed': processed,
+                        'total_messages': total
+                    })
+                )
                 logger.info(f"Successfully processed {processed_count} transactions")
+                generation = notify_data_changed('upload')
                 return jsonify({
                     'message': 'File uploaded and processed successfully',
-                    'processed_count': processed_count
+                    'processed_count': processed_count,
+                    'generation': generation
                 })
             except Exception as e:
                 logger.error(f"Error processing file: {str(e)}")
+                event_broker.publish('ingest_failed', {'filename': filename, 'error': str(e)})
                 return jsonify({'error': str(e)}), 500
             finally:
                 # Always remove the uploaded file after processing to save space
@@ -121,107 +201,186 @@ def upload_file():
         logger.error(f"Unexpected error in upload_file: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def get_transaction_filters():
+    """
+    Read the transaction filter parameters (type, date, search, amount) from the request.
+    """
+    return {
+        'type': request.args.get('type'),
+        'start_date': request.args.get('start_date'),
+        'end_date': request.args.get('end_date'),
+        'search': request.args.get('search'),
+        'min_amount': request.args.get('min_amount'),
+        'max_amount': request.args.get('max_amount')
+    }
+
+def get_page_format():
+    """
+    Read the response format parameters for transaction pages from the request:
+    - fields: comma-separated columns to return, e.g. to skip the message text (default: all)
+    - format: 'rows' for an array of objects (default) or 'columnar' for one array per column
+    Returns a tuple (fields, columnar). Raises ValueError for unknown or empty fields and unknown formats.
+    """
+    fields = parse_fields(request.args.get('fields'))
+    response_format = request.args.get('format', 'rows')
+    if response_format not in ('rows', 'columnar'):
+        raise ValueError(f"Unknown format: {response_format}")
+    return fields, response_format == 'columnar'
+
+def fetch_transactions_page(cursor, filters, page, per_page, fields=TRANSACTION_FIELDS):
+    """
+    Query one page of transactions matching the filters, plus the total number of matches.
+    Only the given fields are selected. Expects a tuple cursor; rows are read into Transaction records.
+    Returns a dictionary with the transactions and pagination details.
+    """
+    transaction_type = filters['type']
+    start_date = filters['start_date']
+    end_date = filters['end_date']
+    search = filters['search']
+    min_amount = filters['min_amount']
+    max_amount = filters['max_amount']
+    # Log received parameters for debugging
+    print(f"Received filter parameters: type={transaction_type}, start_date={start_date}, end_date={end_date}, "
+          f"search={search}, min_amount={min_amount}, max_amount={max_amount}, page={page}")
+    # Calculate offset for pagination
+    offset = (page - 1) * per_page
+    # Base query for counting and selecting transactions
+    count_query = "SELECT COUNT(*) as total FROM transactions WHERE 1=1"
+    # Field names were checked against TRANSACTION_FIELDS, so they are safe to put in the query
+    query = f"SELECT {', '.join(fields)} FROM transactions WHERE 1=1"
+    params = []
+    # Add filters to the query if provided
+    if transaction_type and transaction_type.strip():
+        query += " AND transaction_type = %s"
+        count_query += " AND transaction_type = %s"
+        params.append(transaction_type)
+    if start_date and start_date.strip():
+        query += " AND DATE(transaction_date) >= %s"
+        count_query += " AND DATE(transaction_date) >= %s"
+        params.append(start_date)
+    if end_date and end_date.strip():
+        query += " AND DATE(transaction_date) <= %s"
+        count_query += " AND DATE(transaction_date) <= %s"
+        params.append(end_date)
+    if min_amount and str(min_amount).strip():
+        query += " AND amount >= %s"
+        count_query += " AND amount >= %s"
+        params.append(float(min_amount))
+    if max_amount and str(max_amount).strip():
+        query += " AND amount <= %s"
+        count_query += " AND amount <= %s"
+        params.append(float(max_amount))
+    if search and search.strip():
+        search_terms = f"%{search.strip()}%"
+        query += " AND (message LIKE %s OR sender LIKE %s OR recipient LIKE %s OR phone_number LIKE %s)"
+        count_query += " AND (message LIKE %s OR sender LIKE %s OR recipient LIKE %s OR phone_number LIKE %s)"
+        params.extend([search_terms] * 4)
+    # Log constructed query for debugging
+    print(f"Executing query: {query}")
+    print(f"With parameters: {params}")
+    # Get total count
+    cursor.execute(count_query, params)
+    total = cursor.fetchone()[0]
+    print(f"Total matching records: {total}")
+    
+    # Add pagination
+    query += " ORDER BY transaction_date DESC LIMIT %s OFFSET %s"
+    params.extend([per_page, offset])
+    
+    # Execute final query
+    cursor.execute(query, params)
+    transactions = [Transaction.from_row(row, fields) for row in cursor.fetchall()]
+    print(f"Retrieved {len(transactions)} transactions for current page")
+    
+    return {
+        'transactions': transactions,
+        'fields': fields,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'total_pages': (total + per_page - 1) // per_page
+    }
+
+def write_transactions_page(parts, page, columnar=False):
+    """
+    Append a page from fetch_transactions_page to parts as JSON, serializing the records directly.
+    With columnar=True the transactions are written as {"fields": [...], "columns": [[...], ...]}.
+    """
+    if columnar:
+        parts.append('{"format":"columnar","transactions":')
+        write_transaction_columns(parts, page['transactions'], page['fields'])
+    else:
+        parts.append('{"transactions":')
+        write_transactions(parts, page['transactions'], page['fields'])
+    parts.append(f',"total":{page["total"]},"page":{page["page"]},'
+                 f'"per_page":{page["per_page"]},"total_pages":{page["total_pages"]}}}')
+
+def json_response(body):
+    """Return an already-serialized JSON string as a response."""
+    return Response(body, mimetype='application/json')
+
 @app.route('/api/transactions')
 def get_transactions():
     """
     Retrieve transactions from the database, with optional filtering by type, date, amount, and search term.
-    Supports pagination for large datasets.
+    Supports pagination for large datasets, and fields=/format=columnar to shrink the response.
     Returns a JSON response with the filtered transactions and total count.
     """
     try:
+        # Get filter parameters from the request (type, date, search, amount, pagination, format)
+        filters = get_transaction_filters()
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 10))
+        fields, columnar = get_page_format()
         connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        # Get filter parameters from the request (type, date, search, amount, pagination)
+        cursor = connection.cursor()
+        parts = []
+        write_transactions_page(parts, fetch_transactions_page(cursor, filters, page, per_page, fields), columnar)
+        return json_response(''.join(parts))
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    except Exception as e:
+        print(f"Error in get_transactions: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    finally:
+        if 'connection' in locals() and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def get_approx_summary():
+    """
+    Build approximate summary statistics by merging the per-day, per-type sketches
+    that were saved during ingestion, instead of scanning the transactions table.
+    Supports the same type/start_date/end_date filters as the transactions endpoint.
+    """
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
         transaction_type = request.args.get('type')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
-        search = request.args.get('search')
-        min_amount = request.args.get('min_amount')
-        max_amount = request.args.get('max_amount')
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
-        # Log received parameters for debugging
-        print(f"Received filter parameters: type={transaction_type}, start_date={start_date}, end_date={end_date}, "
-              f"search={search}, min_amount={min_amount}, max_amount={max_amount}, page={page}")
-        # Calculate offset for pagination
-        offset = (page - 1) * per_page
-        # Base query for counting and selecting transactions
-        count_query = "SELECT COUNT(*) as total FROM transactions WHERE 1=1"
-        query = """
-            SELECT 
-                id,
-                transaction_id,
-                transaction_type,
-                amount,
-                fee,
-                sender,
-                recipient,
-                phone_number,
-                transaction_date,
-                balance,
-                message
-            FROM transactions 
-            WHERE 1=1
-        """
-        params = []
-        # Add filters to the query if provided
-        if transaction_type and transaction_type.strip():
-            query += " AND transaction_type = %s"
-            count_query += " AND transaction_type = %s"
-            params.append(transaction_type)
-        if start_date and start_date.strip():
-            query += " AND DATE(transaction_date) >= %s"
-            count_query += " AND DATE(transaction_date) >= %s"
-            params.append(start_date)
-        if end_date and end_date.strip():
-            query += " AND DATE(transaction_date) <= %s"
-            count_query += " AND DATE(transaction_date) <= %s"
-            params.append(end_date)
-        if min_amount and str(min_amount).strip():
-            query += " AND amount >= %s"
-            count_query += " AND amount >= %s"
-            params.append(float(min_amount))
-        if max_amount and str(max_amount).strip():
-            query += " AND amount <= %s"
-            count_query += " AND amount <= %s"
-            params.append(float(max_amount))
-        if search and search.strip():
-            search_terms = f"%{search.strip()}%"
-            query += " AND (message LIKE %s OR sender LIKE %s OR recipient LIKE %s OR phone_number LIKE %s)"
-            count_query += " AND (message LIKE %s OR sender LIKE %s OR recipient LIKE %s OR phone_number LIKE %s)"
-            params.extend([search_terms] * 4)
-        # Log constructed query for debugging
-        print(f"Executing query: {query}")
-        print(f"With parameters: {params}")
-        # Get total count
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()['total']
-        print(f"Total matching records: {total}")
-        
-        # Add pagination
-        query += " ORDER BY transaction_date DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, offset])
-        
-        # Execute final query
-        cursor.execute(query, params)
-        transactions = cursor.fetchall()
-        print(f"Retrieved {len(transactions)} transactions for current page")
-        
-        # Convert datetime objects to string for JSON serialization
-        for transaction in transactions:
-            if transaction['transaction_date']:
-                transaction['transaction_date'] = transaction['transaction_date'].strftime('%Y-%m-%d %H:%M:%S')
-        
-        return jsonify({
-            'transactions': transactions,
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page
+        sketch, bucket_count = load_merged_sketch(
+            cursor,
+            start_date=start_date.strip() if start_date and start_date.strip() else None,
+            end_date=end_date.strip() if end_date and end_date.strip() else None,
+            transaction_type=transaction_type.strip() if transaction_type and transaction_type.strip() else None
+        )
+        summary = sketch.summary()
+        summary.update({
+            'approximate': True,
+            'total_transactions': sketch.count,
+            'buckets_merged': bucket_count
         })
+        return jsonify(summary)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     except Exception as e:
-        print(f"Error in get_transactions: {str(e)}")
+        print(f"Error in get_approx_summary: {str(e)}")
         return jsonify({'error': str(e)}), 500
     
     finally:
@@ -229,111 +388,157 @@ def get_transactions():
             cursor.close()
             connection.close()
 
+def fetch_summary_totals(cursor):
+    """Query the overall totals: transaction count, volume, average, largest amount and fees."""
+    # Get total transaction count
+    cursor.execute("SELECT COUNT(*) as total FROM transactions")
+    total_count = cursor.fetchone()['total']
+    
+    # Get total transaction volume and statistics
+    cursor.execute("""
+        SELECT 
+            COALESCE(SUM(amount), 0) as total_volume,
+            COALESCE(AVG(amount), 0) as avg_amount,
+            COALESCE(MAX(amount), 0) as max_amount,
+            COALESCE(SUM(fee), 0) as total_fees
+        FROM transactions 
+        WHERE amount > 0
+    """)
+    stats = cursor.fetchone()
+    
+    return {
+        'total_transactions': total_count,
+        'total_volume': stats['total_volume'],
+        'statistics': {
+            'avg_amount': stats['avg_amount'],
+            'max_amount': stats['max_amount'],
+            'total_fees': stats['total_fees']
+        }
+    }
+
+def fetch_most_active_day(cursor):
+    """Query the day with the most transactions."""
+    cursor.execute("""
+        SELECT 
+            DATE(transaction_date) as date,
+            COUNT(*) as count
+        FROM transactions
+        GROUP BY DATE(transaction_date)
+        ORDER BY count DESC
+        LIMIT 1
+    """)
+    most_active_day = cursor.fetchone()
+    return {
+        'most_active_day': most_active_day['date'].strftime('%Y-%m-%d') if most_active_day else None,
+        'most_active_day_count': most_active_day['count'] if most_active_day else 0
+    }
+
+def fetch_by_type(cursor):
+    """Query transaction count and volume by type (used by the type charts)."""
+    cursor.execute("""
+        SELECT 
+            transaction_type,
+            COUNT(*) as count,
+            COALESCE(SUM(amount), 0) as total_amount,
+            COALESCE(AVG(amount), 0) as avg_amount
+        FROM transactions
+        WHERE amount > 0
+        GROUP BY transaction_type
+        ORDER BY count DESC
+    """)
+    return {'by_type': cursor.fetchall()}
+
+def fetch_monthly_trends(cursor):
+    """Query monthly transaction trends (used by the monthly trends chart)."""
+    cursor.execute("""
+        SELECT 
+            DATE_FORMAT(transaction_date, '%Y-%m') as month,
+            COUNT(*) as count,
+            COALESCE(SUM(amount), 0) as total_amount,
+            COALESCE(SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END), 0) as inflow,
+            COALESCE(SUM(CASE WHEN amount < 0 THEN ABS(amount) ELSE 0 END), 0) as outflow
+        FROM transactions
+        GROUP BY DATE_FORMAT(transaction_date, '%Y-%m')
+        ORDER BY month
+    """)
+    return {'monthly_trends': cursor.fetchall()}
+
+def fetch_payment_deposit(cursor):
+    """Query the payment vs deposit distribution (used by the payment/deposit chart)."""
+    cursor.execute("""
+        SELECT 
+            CASE 
+                WHEN transaction_type IN ('MONEY_RECEIVED', 'BANK_DEPOSIT') THEN 'Deposits'
+                WHEN transaction_type IN ('PAYMENT', 'TRANSFER', 'WITHDRAWAL') THEN 'Payments'
+                ELSE 'Others'
+            END as category,
+            COUNT(*) as count,
+            COALESCE(SUM(amount), 0) as total_amount
+        FROM transactions
+        WHERE amount > 0
+        GROUP BY 
+            CASE 
+                WHEN transaction_type IN ('MONEY_RECEIVED', 'BANK_DEPOSIT') THEN 'Deposits'
+                WHEN transaction_type IN ('PAYMENT', 'TRANSFER', 'WITHDRAWAL') THEN 'Payments'
+                ELSE 'Others'
+            END
+    """)
+    return {'payment_deposit': cursor.fetchall()}
+
+# The independent queries that together make up the summary response
+SUMMARY_QUERIES = [
+    fetch_summary_totals,
+    fetch_most_active_day,
+    fetch_by_type,
+    fetch_monthly_trends,
+    fetch_payment_deposit
+]
+
+def build_summary(parts):
+    """Combine the results of SUMMARY_QUERIES into the summary response."""
+    summary = {}
+    for part in parts:
+        summary.update(part)
+    # Most active day is reported alongside the other statistics
+    summary['statistics']['most_active_day'] = summary.pop('most_active_day')
+    summary['statistics']['most_active_day_count'] = summary.pop('most_active_day_count')
+    return summary
+
+def load_summary():
+    """Run the summary queries concurrently on pooled connections and combine the results."""
+    summary_futures = [dashboard_executor.submit(run_query, query) for query in SUMMARY_QUERIES]
+    return build_summary([future.result() for future in summary_futures])
+
+def notify_data_changed(reason):
+    """
+    Push the fresh summary to every dashboard listening on /api/events and
+    return the new data generation.
+    The generation is bumped before the summary is loaded, so dashboard loads
+    running at the same time can tell that the data changed under them.
+    If the summary can't be loaded the error is logged and the change is still
+    announced without it, so a failed summary never fails the upload or truncate.
+    """
+    generation = event_broker.start_data_change()
+    try:
+        summary = load_summary()
+    except Exception as e:
+        logger.error(f"Error loading summary for data change: {str(e)}")
+        summary = None
+    return event_broker.publish_data_changed(summary, reason, generation)
+
 @app.route('/api/summary')
 def get_summary():
-    """Get transaction summary statistics."""
+    """
+    Get transaction summary statistics.
+    Pass approx=1 to get sketch-based distinct counts, amount percentiles and
+    top counterparties (with error bounds) instead of the exact statistics.
+    """
+    if request.args.get('approx') in ('1', 'true'):
+        return get_approx_summary()
     try:
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
-        
-        # Get total transaction count
-        cursor.execute("SELECT COUNT(*) as total FROM transactions")
-        total_count = cursor.fetchone()['total']
-        
-        # Get total transaction volume
-        cursor.execute("""
-            SELECT COALESCE(SUM(amount), 0) as total_volume 
-            FROM transactions 
-            WHERE amount > 0
-        """)
-        total_volume = cursor.fetchone()['total_volume']
-        
-        # Get transaction statistics
-        cursor.execute("""
-            SELECT 
-                COALESCE(AVG(amount), 0) as avg_amount,
-                COALESCE(MAX(amount), 0) as max_amount,
-                COALESCE(SUM(fee), 0) as total_fees
-            FROM transactions 
-            WHERE amount > 0
-        """)
-        stats = cursor.fetchone()
-        
-        # Get most active day
-        cursor.execute("""
-            SELECT 
-                DATE(transaction_date) as date,
-                COUNT(*) as count
-            FROM transactions
-            GROUP BY DATE(transaction_date)
-            ORDER BY count DESC
-            LIMIT 1
-        """)
-        most_active_day = cursor.fetchone()
-        
-        # Get transaction count and volume by type
-        cursor.execute("""
-            SELECT 
-                transaction_type,
-                COUNT(*) as count,
-                COALESCE(SUM(amount), 0) as total_amount,
-                COALESCE(AVG(amount), 0) as avg_amount
-            FROM transactions
-            WHERE amount > 0
-            GROUP BY transaction_type
-            ORDER BY count DESC
-        """)
-        by_type = cursor.fetchall()
-        
-        # Get monthly trends
-        cursor.execute("""
-            SELECT 
-                DATE_FORMAT(transaction_date, '%Y-%m') as month,
-                COUNT(*) as count,
-                COALESCE(SUM(amount), 0) as total_amount,
-                COALESCE(SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END), 0) as inflow,
-                COALESCE(SUM(CASE WHEN amount < 0 THEN ABS(amount) ELSE 0 END), 0) as outflow
-            FROM transactions
-            GROUP BY DATE_FORMAT(transaction_date, '%Y-%m')
-            ORDER BY month
-        """)
-        monthly_trends = cursor.fetchall()
-        
-        # Get payment vs deposit distribution
-        cursor.execute("""
-            SELECT 
-                CASE 
-                    WHEN transaction_type IN ('MONEY_RECEIVED', 'BANK_DEPOSIT') THEN 'Deposits'
-                    WHEN transaction_type IN ('PAYMENT', 'TRANSFER', 'WITHDRAWAL') THEN 'Payments'
-                    ELSE 'Others'
-                END as category,
-                COUNT(*) as count,
-                COALESCE(SUM(amount), 0) as total_amount
-            FROM transactions
-            WHERE amount > 0
-            GROUP BY 
-                CASE 
-                    WHEN transaction_type IN ('MONEY_RECEIVED', 'BANK_DEPOSIT') THEN 'Deposits'
-                    WHEN transaction_type IN ('PAYMENT', 'TRANSFER', 'WITHDRAWAL') THEN 'Payments'
-                    ELSE 'Others'
-                END
-        """)
-        payment_deposit = cursor.fetchall()
-        
-        return jsonify({
-            'total_transactions': total_count,
-            'total_volume': total_volume,
-            'statistics': {
-                'avg_amount': stats['avg_amount'],
-                'max_amount': stats['max_amount'],
-                'total_fees': stats['total_fees'],
-                'most_active_day': most_active_day['date'].strftime('%Y-%m-%d') if most_active_day else None,
-                'most_active_day_count': most_active_day['count'] if most_active_day else 0
-            },
-            'by_type': by_type,
-            'monthly_trends': monthly_trends,
-            'payment_deposit': payment_deposit
-        })
+        return jsonify(build_summary([query(cursor) for query in SUMMARY_QUERIES]))
     
     except Exception as e:
         print(f"Error in get_summary: {str(e)}")
@@ -344,6 +549,49 @@ def get_summary():
             cursor.close()
             connection.close()
 
+@app.route('/api/dashboard')
+def get_dashboard():
+    """
+    Return everything the dashboard needs on load in one response:
+    the summary statistics, the chart data and the first page of transactions.
+    Accepts the same filter, pagination and format parameters as /api/transactions.
+    Each query runs at the same time on its own pooled connection, so the
+    response takes about as long as the slowest query instead of all of them added up.
+
+    The queries don't share a snapshot, so an import or truncate swapping the tables
+    in the middle could mix the old and new datasets. The data generation is read
+    before and after the queries and the load is retried once if it changed. If it
+    changed again, the generation from before is returned, so the dashboard sees it is
+    behind and reloads. A swap is only noticed once the generation is bumped, right
+    after the import or truncate finishes.
+    """
+    try:
+        filters = get_transaction_filters()
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 10))
+        fields, columnar = get_page_format()
+        for attempt in range(2):
+            generation = event_broker.generation
+            page_future = dashboard_executor.submit(
+                run_query, fetch_transactions_page, filters, page, per_page, fields, dictionary=False
+            )
+            summary = load_summary()
+            transactions_page = page_future.result()
+            if event_broker.generation == generation:
+                break
+            logger.info("Data changed while loading the dashboard")
+        parts = [f'{{"summary":{app.json.dumps(summary)},"generation":{generation},"page":']
+        write_transactions_page(parts, transactions_page, columnar)
+        parts.append('}')
+        return json_response(''.join(parts))
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    except Exception as e:
+        print(f"Error in get_dashboard: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/transaction/<transaction_id>')
 def get_transaction_details(transaction_id):
     """Get detailed information for a specific transaction."""
@@ -371,27 +619,150 @@ def get_transaction_details(transaction_id):
             cursor.close()
             connection.close()
 
+@app.route('/api/transactions/lookup', methods=['POST'])
+def lookup_transactions():
+    """
+    Look up many transactions by transaction ID in one request.
+    - Expects a JSON body like {"transaction_ids": ["123", "456", ...]}.
+    - Resolves the IDs with batched IN (...) queries on the transaction_id index.
+    - Returns the found transactions plus the list of IDs that were not found,
+      as they were sent (strings or integers).
+    """
+    try:
+        data = request.get_json(silent=True)
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        transaction_ids = data.get('transaction_ids')
+        if not isinstance(transaction_ids, list):
+            return jsonify({'error': 'transaction_ids must be a list'}), 400
+        if len(transaction_ids) > MAX_LOOKUP_IDS:
+            return jsonify({'error': f'At most {MAX_LOOKUP_IDS} transaction IDs can be looked up at once'}), 400
+        # IDs may be sent as strings or integers; anything else (null, objects, booleans) is rejected
+        if any(isinstance(tid, bool) or not isinstance(tid, (str, int)) for tid in transaction_ids):
+            return jsonify({'error': 'transaction_ids must only contain strings or integers'}), 400
+        # Remove duplicates and blanks but keep the order the IDs were sent in. Transaction IDs
+        # are stored as strings, so integers are matched by their string form but
+        # reported back (in "missing") the way the client sent them.
+        sent_ids = {}
+        for tid in transaction_ids:
+            key = str(tid).strip()
+            if key and key not in sent_ids:
+                sent_ids[key] = tid
+        transaction_ids = list(sent_ids)
+
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        transactions = []
+        for start in range(0, len(transaction_ids), LOOKUP_BATCH_SIZE):
+            batch = transaction_ids[start:start + LOOKUP_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions WHERE transaction_id IN ({placeholders})",
+                batch
+            )
+            transactions.extend(Transaction.from_row(row) for row in cursor.fetchall())
+
+        found_ids = {transaction.transaction_id for transaction in transactions}
+        missing = [sent_ids[tid] for tid in transaction_ids if tid not in found_ids]
+        return json_response(
+            f'{{"transactions":{dump_transactions(transactions)},"missing":{app.json.dumps(missing)},'
+            f'"requested":{len(transaction_ids)},"found":{len(transaction_ids) - len(missing)}}}'
+        )
+    
+    except Exception as e:
+        print(f"Error in lookup_transactions: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    finally:
+        if 'connection' in locals() and connection.is_connected():
+            cursor.close()
+            connection.close()
+
 @app.route('/api/truncate', methods=['POST'])
 def truncate_transactions():
-    """Truncate the transactions table."""
+    """
+    Clear the transactions and their approximate analytics sketches.
+    Empty shadow tables are swapped in with RENAME TABLE (like an import),
+    so the clear never blocks dashboard reads for long.
+    """
+    lock_acquired = False
     try:
         connection = get_db_connection()
         cursor = connection.cursor()
         
-        # Truncate both tables
-        cursor.execute("TRUNCATE TABLE transactions")
-#        cursor.execute("TRUNCATE TABLE monthly_summary")
+        acquire_reload_lock(cursor)
+        lock_acquired = True
+        create_shadow_tables(cursor)
+        swap_shadow_tables(cursor)
         
         connection.commit()
-        return jsonify({'message': 'All transactions cleared successfully'})
+        generation = notify_data_changed('truncate')
+        return jsonify({'message': 'All transactions cleared successfully', 'generation': generation})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
     finally:
         if 'connection' in locals() and connection.is_connected():
+            if lock_acquired:
+                release_reload_lock(cursor)
             cursor.close()
             connection.close()
 
+@app.after_request
+def compress_response(response):
+    """
+    Compress JSON responses with brotli or gzip, whichever the client accepts
+    (brotli preferred). Small, streamed (e.g. /api/events) and already-encoded
+    responses are left as they are.
+    """
+    if (response.mimetype != 'application/json' or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+    if brotli is not None and request.accept_encodings['br']:
+        response.set_data(brotli.compress(data, quality=4))
+        response.headers['Content-Encoding'] = 'br'
+    elif request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def format_sse(event, data):
+    """Format an event and its JSON payload as a server-sent events message."""
+    return f"event: {event}\ndata: {app.json.dumps(data)}\n\n"
+
+@app.route('/api/events')
+def stream_events():
+    """
+    Server-sent events stream for the dashboard.
+    - Sends a 'hello' event with the current data generation when a client connects.
+    - Then forwards ingest_progress, ingest_failed and data_changed events as they happen.
+    Dashboards use this instead of re-requesting the summary after uploads and truncates.
+    """
+    def generate():
+        subscriber = event_broker.subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            yield format_sse('hello', {'generation': event_broker.generation})
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=SSE_HEARTBEAT_SECONDS)
+                    yield format_sse(event, data)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            event_broker.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True) 
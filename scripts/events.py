@@ -0,0 +1,95 @@
+"""
+MTN MoMo Transaction Analysis - Data Change Events
+
+This module keeps track of the dashboards listening on the /api/events
+server-sent events stream and pushes events to them:
+- ingest_progress while an uploaded XML file is being processed
+- ingest_failed if processing an upload fails
+- data_changed when an upload or truncate completes, with the fresh summary
+  (or without it if it couldn't be loaded, so dashboards reload it themselves)
+
+Every data change bumps a "generation" number, so a dashboard that reconnects
+can tell whether it missed a change while it was disconnected.
+The broker lives in the app process, so all listeners must share that process.
+"""
+
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class EventBroker:
+    """
+    Fan out events to every subscribed listener.
+    Each listener gets its own bounded queue; if a listener stops reading and
+    its queue fills up, new events for it are dropped instead of blocking the app.
+    """
+
+    def __init__(self, max_queued_events=100):
+        self.max_queued_events = max_queued_events
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.last_summary = None
+
+    def subscribe(self):
+        """Register a new listener and return the queue its events arrive on."""
+        subscriber = queue.Queue(maxsize=self.max_queued_events)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        logger.info(f"Event listener connected ({len(self.subscribers)} total)")
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Remove a listener, e.g. when its connection closes."""
+        with self.lock:
+            self.subscribers.discard(subscriber)
+        logger.info(f"Event listener disconnected ({len(self.subscribers)} total)")
+
+    def publish(self, event, data):
+        """Send an event with a JSON-serializable payload to every listener."""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                logger.warning(f"Dropping '{event}' event for a listener that is not keeping up")
+
+    def start_data_change(self):
+        """
+        Start a new data generation and return its number. Call this as soon as the
+        data has changed, so readers comparing generations notice the change early.
+        """
+        with self.lock:
+            self.generation += 1
+            return self.generation
+
+    def publish_data_changed(self, summary, reason, generation=None):
+        """
+        Push the fresh summary for a data generation to every listener, along with
+        how the headline totals changed since the previous push.
+        A new generation is started unless one from start_data_change() is given.
+        summary may be None if it couldn't be loaded; listeners then reload it themselves.
+        Returns the generation number.
+        """
+        if generation is None:
+            generation = self.start_data_change()
+        with self.lock:
+            previous = self.last_summary
+            if summary is not None:
+                self.last_summary = summary
+        delta = None
+        if previous is not None and summary is not None:
+            delta = {
+                'total_transactions': summary['total_transactions'] - previous['total_transactions'],
+                'total_volume': summary['total_volume'] - previous['total_volume']
+            }
+        self.publish('data_changed', {
+            'generation': generation,
+            'reason': reason,
+            'summary': summary,
+            'delta': delta
+        })
+        return generation
@@ -5,7 +5,8 @@ This script sets up the MySQL database and creates the necessary tables
 for storing transaction data. It will:
 1. Create the database if it doesn't exist
 2. Create the transactions table with the right columns
-3. Create indexes to make queries faster
+3. Create the transaction_sketches tables (daily and monthly) used for approximate analytics
+4. Create indexes to make queries faster
 """
 
 import os
@@ -63,8 +64,11 @@ def create_database():
 
 def create_tables(cursor):
     """
-    Create the transactions table with all the columns needed for the app.
-    If the table already exists, this does nothing.
+    Create the transactions table with all the columns needed for the app,
+    the transaction_sketches table that stores one row of approximate
+    analytics sketches per day and transaction type, and the
+    transaction_sketches_monthly table with the same sketches rolled up per month.
+    If the tables already exist, this does nothing.
     Raises an error if table creation fails.
     """
     try:
@@ -87,6 +91,28 @@ def create_tables(cursor):
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
         """)
         logger.info("Transactions table created successfully")
+        # Create sketches table for approximate analytics (see scripts/sketches.py)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transaction_sketches (
+            sketch_date DATE NOT NULL,
+            transaction_type VARCHAR(50) NOT NULL,
+            transaction_count INT NOT NULL,
+            payload MEDIUMTEXT NOT NULL,
+            PRIMARY KEY (sketch_date, transaction_type)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+        logger.info("Transaction sketches table created successfully")
+        # Monthly rollups of the daily sketches; sketch_date is the first day of the month
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transaction_sketches_monthly (
+            sketch_date DATE NOT NULL,
+            transaction_type VARCHAR(50) NOT NULL,
+            transaction_count INT NOT NULL,
+            payload MEDIUMTEXT NOT NULL,
+            PRIMARY KEY (sketch_date, transaction_type)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+        logger.info("Monthly transaction sketches table created successfully")
     except mysql.connector.Error as err:
         logger.error(f"Error creating tables: {err}")
         raise
@@ -100,6 +126,7 @@ def create_indexes(cursor):
     try:
         # Create composite indexes for common query patterns
         indexes = [
+            ("idx_transaction_id", "ON transactions (transaction_id)"),
             ("idx_type_date", "ON transactions (transaction_type, transaction_date)"),
             ("idx_date_amount", "ON transactions (transaction_date, amount)"),
             ("idx_sender_recipient", "ON transactions (sender, recipient)")
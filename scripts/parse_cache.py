@@ -0,0 +1,203 @@
+"""
+MTN MoMo Transaction Analysis - SMS Parse Cache
+
+Nightly backups overlap heavily, so most SMS messages in an upload have
+already been parsed before. This module keeps the result of process_sms for
+each message in a local SQLite file, keyed by a hash of the parser version and
+the message body, so re-imports can skip the regex extraction for known messages.
+
+- The parser version is a fingerprint of the extraction code. When the rules
+  change the fingerprint changes, and the cached results are thrown away.
+- The cache is bounded: the least recently used entries are evicted once it
+  holds more than PARSE_CACHE_MAX_ENTRIES results.
+- Each run reports its hits, misses and hit rate.
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+from datetime import datetime
+from scripts.records import INSERT_FIELDS, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Parse cache configuration
+PARSE_CACHE_PATH = os.getenv('PARSE_CACHE_PATH', os.path.join('cache', 'parse_cache.sqlite3'))
+PARSE_CACHE_MAX_ENTRIES = int(os.getenv('PARSE_CACHE_MAX_ENTRIES', 200000))
+
+# Fields stored for each cached transaction; the message is the SMS body itself
+CACHED_FIELDS = tuple(field for field in INSERT_FIELDS if field != 'message')
+DATE_INDEX = CACHED_FIELDS.index('transaction_date')
+
+# Pending new results are written to the file in batches of this size
+WRITE_BATCH_SIZE = 1000
+
+# Number of keys looked up per query when prefetching (below SQLite's variable limit)
+PREFETCH_BATCH_SIZE = 500
+
+def _encode_result(transaction):
+    """Serialize a process_sms result (a Transaction or None) for storage."""
+    if transaction is None:
+        return 'null'
+    values = []
+    for field in CACHED_FIELDS:
+        value = getattr(transaction, field)
+        values.append(value.isoformat() if isinstance(value, datetime) else value)
+    return json.dumps(values)
+
+def _decode_result(value, body):
+    """Rebuild a process_sms result from its stored form and the SMS body."""
+    values = json.loads(value)
+    if values is None:
+        return None
+    if values[DATE_INDEX]:
+        values[DATE_INDEX] = datetime.fromisoformat(values[DATE_INDEX])
+    # CACHED_FIELDS are the Transaction fields between id and message, in order
+    return Transaction(None, *values, body)
+
+class ParseCache:
+    """
+    An on-disk cache of process_sms results for one import run.
+    Call prefetch() with the run's messages to load their cached results in a few
+    batched queries, use get() before parsing a message and put() after a miss,
+    then close() to write pending results, evict old entries and log the hit-rate report.
+    """
+
+    def __init__(self, parser_version, path=PARSE_CACHE_PATH, max_entries=PARSE_CACHE_MAX_ENTRIES):
+        self.parser_version = parser_version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.pending = []
+        self.used_keys = []
+        self.prefetched = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                last_used INTEGER NOT NULL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)")
+        # Throw away results from an older parser, they may no longer be correct
+        if self._get_meta('parser_version') != parser_version:
+            self.connection.execute("DELETE FROM entries")
+            self._set_meta('parser_version', parser_version)
+            logger.info(f"Parse cache reset for parser version {parser_version}")
+        # Every run gets a higher number, so least recently used entries can be found by last_used
+        self.run_number = int(self._get_meta('run_number') or 0) + 1
+        self._set_meta('run_number', str(self.run_number))
+        self.connection.commit()
+
+    def _get_meta(self, name):
+        row = self.connection.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name, value):
+        self.connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def _key(self, body):
+        return hashlib.sha256(f"{self.parser_version}\0{body}".encode('utf-8')).hexdigest()
+
+    def prefetch(self, bodies):
+        """
+        Load the cached results for all of the given SMS bodies into memory,
+        so get() doesn't need a query per message.
+        """
+        keys = list({self._key(body) for body in bodies})
+        self.prefetched = {}
+        for start in range(0, len(keys), PREFETCH_BATCH_SIZE):
+            batch = keys[start:start + PREFETCH_BATCH_SIZE]
+            placeholders = ', '.join(['?'] * len(batch))
+            rows = self.connection.execute(
+                f"SELECT key, result FROM entries WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            self.prefetched.update(rows)
+
+    def get(self, body):
+        """
+        Look up the cached result for an SMS body.
+        Returns a tuple (found, transaction); transaction may be None for messages
+        that process_sms didn't treat as transactions.
+        """
+        key = self._key(body)
+        if self.prefetched is not None:
+            result = self.prefetched.get(key)
+        else:
+            row = self.connection.execute("SELECT result FROM entries WHERE key = ?", (key,)).fetchone()
+            result = row[0] if row else None
+        if result is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self.used_keys.append((self.run_number, key))
+        return True, _decode_result(result, body)
+
+    def put(self, body, transaction):
+        """
+        Store the process_sms result for an SMS body.
+        After prefetch() the result is also kept in memory, so a message that
+        appears again later in the same run is a hit instead of being parsed twice.
+        """
+        key = self._key(body)
+        encoded = _encode_result(transaction)
+        if self.prefetched is not None:
+            self.prefetched[key] = encoded
+        self.pending.append((key, encoded, self.run_number))
+        if len(self.pending) >= WRITE_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self.pending:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO entries (key, result, last_used) VALUES (?, ?, ?)", self.pending
+            )
+            self.pending = []
+        if self.used_keys:
+            self.connection.executemany("UPDATE entries SET last_used = ? WHERE key = ?", self.used_keys)
+            self.used_keys = []
+        self.connection.commit()
+
+    def _evict(self):
+        """Remove the least recently used entries beyond max_entries."""
+        count = self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count > self.max_entries:
+            self.evicted = count - self.max_entries
+            self.connection.execute("""
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM entries ORDER BY last_used LIMIT ?
+                )
+            """, (self.evicted,))
+            self.connection.commit()
+        return count - self.evicted
+
+    def report(self):
+        """Return this run's cache statistics."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evicted': self.evicted
+        }
+
+    def close(self):
+        """Write pending results, evict old entries, log the hit-rate report and close the file."""
+        try:
+            self._flush()
+            entries = self._evict()
+            report = self.report()
+            logger.info(
+                f"Parse cache: {report['hits']} hits, {report['misses']} misses "
+                f"({report['hit_rate']:.1%} hit rate), {entries} entries, {report['evicted']} evicted"
+            )
+        finally:
+            self.connection.close()
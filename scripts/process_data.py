@@ -7,18 +7,39 @@ It provides functionality for:
 - Extracting transaction details using regular expressions
 - Classifying transaction types
 - Storing processed data in the database
+- Building approximate analytics sketches while data is stored
+
+Parse results are cached on disk per SMS body (see scripts/parse_cache.py),
+so messages seen in an earlier upload skip the regex extraction.
+
+Imports are loaded into shadow copies of the tables and swapped in with a
+single RENAME TABLE once complete, so the dashboard always reads a full
+dataset and a failed import leaves the previous data in place.
 
 The module uses BeautifulSoup for XML parsing and regular expressions for data extraction.
 """
 
 import os
 import re
+import sys
+import sqlite3
+import hashlib
+import inspect
 import logging
 import mysql.connector
 from bs4 import BeautifulSoup
 from datetime import datetime
 from dotenv import load_dotenv
 
+# When run directly (python scripts/process_data.py) the project root isn't on
+# the import path, so add it for the scripts.* imports below
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.records import TRANSACTION_FIELDS, Transaction
+from scripts.parse_cache import ParseCache
+from scripts.sketches import add_to_sketches, rollup_by_month, save_sketches
+
 # Set up logging so we can track what happens during data processing.
 # This helps us debug issues and understand the flow of data.
 logging.basicConfig(
@@ -160,65 +181,137 @@ def extract_names(text):
 def process_sms(sms_text):
     """
     Process a single SMS message and extract all relevant transaction information.
-    Returns a dictionary with transaction details, or None if the SMS is not a valid transaction.
+    Returns a Transaction record, or None if the SMS is not a valid transaction.
     """
     amount = extract_amount(sms_text)
     transaction_type = determine_transaction_type(sms_text)
     # Skip processing if no valid amount found for relevant transaction types
     if amount == 0 and transaction_type not in ['AIRTIME', 'BUNDLE_PURCHASE']:
         return None
-    transaction = {
-        'transaction_id': extract_transaction_id(sms_text),
-        'transaction_type': transaction_type,
-        'amount': amount,
-        'fee': extract_fee(sms_text),
-        'phone_number': extract_phone_number(sms_text),
-        'transaction_date': extract_transaction_date(sms_text),
-        'balance': extract_balance(sms_text),
-        'message': sms_text
-    }
     sender, recipient = extract_names(sms_text)
-    transaction['sender'] = sender
-    transaction['recipient'] = recipient
-    return transaction
+    return Transaction(
+        transaction_id=extract_transaction_id(sms_text),
+        transaction_type=transaction_type,
+        amount=amount,
+        fee=extract_fee(sms_text),
+        sender=sender,
+        recipient=recipient,
+        phone_number=extract_phone_number(sms_text),
+        transaction_date=extract_transaction_date(sms_text),
+        balance=extract_balance(sms_text),
+        message=sms_text
+    )
+
+def parser_version():
+    """
+    Return a fingerprint of the SMS extraction rules: a hash of the source code of
+    every function process_sms relies on and of the Transaction fields.
+    Any change to the rules gives a new version, which invalidates the parse cache.
+    """
+    functions = (
+        extract_amount, extract_phone_number, extract_transaction_id, determine_transaction_type,
+        extract_transaction_date, extract_balance, extract_fee, extract_names, process_sms
+    )
+    source = ''.join(inspect.getsource(function) for function in functions) + ','.join(TRANSACTION_FIELDS)
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+
+def open_parse_cache():
+    """
+    Open the on-disk parse cache for an import run.
+    Returns None (and the import parses every message) if the cache file can't be opened.
+    """
+    try:
+        return ParseCache(parser_version())
+    except (sqlite3.Error, OSError) as err:
+        logger.warning(f"Parse cache unavailable, parsing every message: {err}")
+        return None
+
+# Tables replaced together on every import or truncate, and the
+# suffixes used for the copies while they are being replaced
+LIVE_TABLES = ('transactions', 'transaction_sketches', 'transaction_sketches_monthly')
+SHADOW_SUFFIX = '_shadow'
+OLD_SUFFIX = '_old'
+
+# Named MySQL lock that stops two imports/truncates from using the shadow tables at once
+RELOAD_LOCK_NAME = 'momo_analysis_reload'
+RELOAD_LOCK_TIMEOUT = 60
+
+def acquire_reload_lock(cursor):
+    """
+    Take the named reload lock, waiting up to RELOAD_LOCK_TIMEOUT seconds.
+    Raises an error if another import or truncate is still holding it.
+    """
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (RELOAD_LOCK_NAME, RELOAD_LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("Another import or truncate is in progress, please try again later")
+
+def release_reload_lock(cursor):
+    """Release the named reload lock."""
+    cursor.execute("SELECT RELEASE_LOCK(%s)", (RELOAD_LOCK_NAME,))
+    cursor.fetchone()
 
-def insert_transaction(cursor, transaction):
-    """Insert a transaction into the database."""
-    sql = """
-    INSERT INTO transactions (
+def create_shadow_tables(cursor):
+    """
+    Create empty shadow copies of the live tables (same columns and indexes),
+    replacing any shadow or old tables left behind by an earlier failed import.
+    """
+    for table in LIVE_TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}{OLD_SUFFIX}")
+        cursor.execute(f"DROP TABLE IF EXISTS {table}{SHADOW_SUFFIX}")
+        cursor.execute(f"CREATE TABLE {table}{SHADOW_SUFFIX} LIKE {table}")
+    logger.info("Created shadow tables")
+
+def drop_shadow_tables(cursor):
+    """Drop the shadow tables, e.g. after a failed import."""
+    for table in LIVE_TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}{SHADOW_SUFFIX}")
+    logger.info("Dropped shadow tables")
+
+def swap_shadow_tables(cursor):
+    """
+    Atomically replace every live table with its shadow copy in a single RENAME TABLE,
+    so readers see either all of the old data or all of the new data, then drop the old tables.
+    """
+    renames = []
+    for table in LIVE_TABLES:
+        renames.append(f"{table} TO {table}{OLD_SUFFIX}")
+        renames.append(f"{table}{SHADOW_SUFFIX} TO {table}")
+    cursor.execute(f"RENAME TABLE {', '.join(renames)}")
+    for table in LIVE_TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}{OLD_SUFFIX}")
+    logger.info("Swapped shadow tables in")
+
+def insert_transaction(cursor, transaction, table='transactions'):
+    """Insert a transaction into the database (or into another table with the same columns)."""
+    sql = f"""
+    INSERT INTO {table} (
         transaction_id, transaction_type, amount, fee, sender, recipient,
         phone_number, transaction_date, balance, message
     ) VALUES (
         %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
     )
     """
-    values = (
-        transaction['transaction_id'],
-        transaction['transaction_type'],
-        transaction['amount'],
-        transaction['fee'],
-        transaction['sender'],
-        transaction['recipient'],
-        transaction['phone_number'],
-        transaction['transaction_date'],
-        transaction['balance'],
-        transaction['message']
-    )
-    cursor.execute(sql, values)
+    cursor.execute(sql, transaction.insert_values())
 
-def process_xml_file(file_path):
+def process_xml_file(file_path, progress_callback=None):
     """
     Process the XML file and load data into the database.
     
     Args:
         file_path (str): Path to the XML file
+        progress_callback (callable, optional): Called as progress_callback(processed_count, total_messages)
+            when processing starts, every 100 transactions, and once processing is complete
         
     Returns:
         int: Number of transactions processed
         
     Raises:
-        Exception: If there's an error processing the file or database operations
+        Exception: If there's an error processing the file or database operations,
+            if any transaction could not be inserted, or if no transaction could be
+            loaded from the file. The live tables are left unchanged in these cases.
     """
+    lock_acquired = False
+    parse_cache = None
     try:
         logger.info(f"Starting to process XML file: {file_path}")
         # Print for demo: show file being processed
@@ -235,49 +328,101 @@ def process_xml_file(file_path):
         connection = mysql.connector.connect(**db_config)
         cursor = connection.cursor()
         
-        # Clear existing data
-        cursor.execute("TRUNCATE TABLE transactions")
-        connection.commit()
-        logger.info("Cleared existing transaction data")
+        # Load into empty shadow tables; the live tables stay readable until the swap
+        acquire_reload_lock(cursor)
+        lock_acquired = True
+        create_shadow_tables(cursor)
+        parse_cache = open_parse_cache()
         
         # Process each SMS
         processed_count = 0
+        failed_count = 0
+        sketches = {}
         sms_elements = soup.find_all('sms')
         logger.info(f"Found {len(sms_elements)} SMS elements in the XML file")
+        if progress_callback:
+            progress_callback(0, len(sms_elements))
+        if parse_cache:
+            parse_cache.prefetch([sms.get('body', '') for sms in sms_elements if sms.get('address') == 'M-Money'])
         
         for sms in sms_elements:
             if sms.get('address') == 'M-Money':
                 body = sms.get('body', '')
                 logger.debug(f"Processing SMS: {body[:100]}...")
                 
-                transaction = process_sms(body)
+                # Reuse the parse result from an earlier upload if this message was seen before
+                found = False
+                if parse_cache:
+                    found, transaction = parse_cache.get(body)
+                if not found:
+                    transaction = process_sms(body)
+                    if parse_cache:
+                        parse_cache.put(body, transaction)
                 if transaction:
-                    if transaction['transaction_date'] is None:
+                    if transaction.transaction_date is None:
                         logger.warning(f"Skipping transaction due to missing date: {body[:100]}...")
                         continue
                     
                     try:
-                        insert_transaction(cursor, transaction)
+                        insert_transaction(cursor, transaction, table=f"transactions{SHADOW_SUFFIX}")
                         connection.commit()
                         processed_count += 1
+                        add_to_sketches(sketches, transaction)
                         if processed_count % 100 == 0:
                             logger.info(f"Processed {processed_count} transactions...")
+                            if progress_callback:
+                                progress_callback(processed_count, len(sms_elements))
                     except Exception as insert_error:
                         logger.error(f"Error inserting transaction: {insert_error}")
                         logger.error(f"Transaction data: {transaction}")
                         connection.rollback()
+                        failed_count += 1
+        
+        # Only replace the live data with a complete import; raising drops the shadow tables below
+        if failed_count:
+            raise RuntimeError(
+                f"{failed_count} of {processed_count + failed_count} transactions could not be inserted, "
+                f"keeping the existing data"
+            )
+        # An import that loads nothing is always rejected; clearing the data is /api/truncate's job
+        if processed_count == 0:
+            raise ValueError("No transactions could be loaded from the file, keeping the existing data")
+        
+        # Save the approximate analytics sketches for the inserted transactions
+        save_sketches(cursor, sketches, table=f"transaction_sketches{SHADOW_SUFFIX}")
+        save_sketches(cursor, rollup_by_month(sketches), table=f"transaction_sketches_monthly{SHADOW_SUFFIX}")
+        connection.commit()
+        
+        # Replace the live data with the fully loaded shadow tables
+        swap_shadow_tables(cursor)
         
         logger.info(f"Processing completed. Total transactions processed: {processed_count}")
+        if progress_callback:
+            progress_callback(processed_count, len(sms_elements))
         return processed_count
         
     except Exception as e:
         logger.error(f"Error processing XML file: {e}")
-        if 'connection' in locals():
+        if 'connection' in locals() and connection.is_connected():
             connection.rollback()
+            if lock_acquired:
+                # Throw away the partial import; the live tables were never touched
+                try:
+                    drop_shadow_tables(cursor)
+                except mysql.connector.Error as drop_error:
+                    logger.error(f"Error dropping shadow tables: {drop_error}")
         raise
     
     finally:
+        if parse_cache:
+            # Keep the parse results even if the import failed, they are still valid
+            try:
+                parse_cache.close()
+            except sqlite3.Error as cache_error:
+                logger.error(f"Error saving parse cache: {cache_error}")
         if 'connection' in locals() and connection.is_connected():
+            if lock_acquired:
+                release_reload_lock(cursor)
             cursor.close()
             connection.close()
             logger.info("Database connection closed")
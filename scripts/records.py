@@ -0,0 +1,161 @@
+"""
+MTN MoMo Transaction Analysis - Transaction Records
+
+This module defines the Transaction record used from parsing through to the
+API responses:
+- process_sms builds a Transaction from an SMS message
+- insert_transaction writes its values straight into the INSERT statement
+- the API reads rows with plain tuple cursors into Transactions and
+  dump_transactions writes them to JSON without building a dict per row,
+  either as an array of objects or column-oriented (names once, one
+  array of values per column), optionally limited to some fields
+
+Transaction uses __slots__, so each record is a small fixed-size object
+instead of a per-row dictionary.
+"""
+
+import json
+from operator import attrgetter
+
+# Column order used for SELECTs that are read back into Transaction records
+TRANSACTION_FIELDS = (
+    'id',
+    'transaction_id',
+    'transaction_type',
+    'amount',
+    'fee',
+    'sender',
+    'recipient',
+    'phone_number',
+    'transaction_date',
+    'balance',
+    'message'
+)
+
+# Columns written by insert_transaction (id is assigned by the database)
+INSERT_FIELDS = TRANSACTION_FIELDS[1:]
+
+class Transaction:
+    """
+    A single MoMo transaction. Fields match the columns of the transactions table.
+    """
+
+    __slots__ = TRANSACTION_FIELDS
+
+    def __init__(self, id=None, transaction_id=None, transaction_type=None, amount=None, fee=None,
+                 sender=None, recipient=None, phone_number=None, transaction_date=None,
+                 balance=None, message=None):
+        self.id = id
+        self.transaction_id = transaction_id
+        self.transaction_type = transaction_type
+        self.amount = amount
+        self.fee = fee
+        self.sender = sender
+        self.recipient = recipient
+        self.phone_number = phone_number
+        self.transaction_date = transaction_date
+        self.balance = balance
+        self.message = message
+
+    @classmethod
+    def from_row(cls, row, fields=TRANSACTION_FIELDS):
+        """
+        Build a Transaction from a tuple row selected in the given fields order.
+        Fields that weren't selected are left as None.
+        """
+        if fields is TRANSACTION_FIELDS:
+            return cls(*row)
+        record = cls()
+        for field, value in zip(fields, row):
+            setattr(record, field, value)
+        return record
+
+    def insert_values(self):
+        """Return the values for an INSERT in INSERT_FIELDS order."""
+        return _insert_getter(self)
+
+    def __repr__(self):
+        return (f"Transaction(transaction_id={self.transaction_id!r}, transaction_type={self.transaction_type!r}, "
+                f"amount={self.amount!r}, transaction_date={self.transaction_date!r})")
+
+_insert_getter = attrgetter(*INSERT_FIELDS)
+
+# JSON encoders for each field. The output matches what jsonify produced for
+# the old dictionary rows: decimals as strings and dates as 'YYYY-MM-DD HH:MM:SS'.
+_encode_string = json.encoder.encode_basestring_ascii
+
+def _json_string(value):
+    return 'null' if value is None else _encode_string(value)
+
+def _json_int(value):
+    return 'null' if value is None else str(value)
+
+def _json_decimal(value):
+    return 'null' if value is None else f'"{value}"'
+
+def _json_datetime(value):
+    return 'null' if value is None else value.strftime('"%Y-%m-%d %H:%M:%S"')
+
+FIELD_ENCODERS = {
+    'id': _json_int,
+    'transaction_id': _json_string,
+    'transaction_type': _json_string,
+    'amount': _json_decimal,
+    'fee': _json_decimal,
+    'sender': _json_string,
+    'recipient': _json_string,
+    'phone_number': _json_string,
+    'transaction_date': _json_datetime,
+    'balance': _json_decimal,
+    'message': _json_string
+}
+
+def parse_fields(value):
+    """
+    Parse a comma-separated fields= parameter into a tuple of field names.
+    Returns TRANSACTION_FIELDS when the parameter is missing or blank.
+    Raises ValueError if a field name is unknown, or if the parameter only
+    holds separators (e.g. fields=,).
+    """
+    if not value or not value.strip():
+        return TRANSACTION_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    if not fields:
+        raise ValueError("No fields given")
+    unknown = [field for field in fields if field not in FIELD_ENCODERS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def write_transactions(parts, records, fields=TRANSACTION_FIELDS):
+    """
+    Append a JSON array of objects for the Transaction records to the list parts.
+    Callers join parts once at the end, so the output is only copied a single time.
+    """
+    keys = [f'"{field}":' for field in fields]
+    encoders = [FIELD_ENCODERS[field] for field in fields]
+    getter = attrgetter(*fields)
+    separator = '['
+    for record in records:
+        values = getter(record) if len(fields) > 1 else (getter(record),)
+        parts.append(separator + '{' + ','.join([key + encode(value) for key, encode, value in zip(keys, encoders, values)]) + '}')
+        separator = ','
+    parts.append(']' if separator == ',' else '[]')
+
+def write_transaction_columns(parts, records, fields=TRANSACTION_FIELDS):
+    """
+    Append a column-oriented JSON object for the Transaction records to the list parts:
+    {"fields": [...], "columns": [[values of the first field], [values of the second field], ...]}
+    """
+    parts.append('{"fields":' + json.dumps(list(fields), separators=(',', ':')) + ',"columns":[')
+    for index, field in enumerate(fields):
+        encode = FIELD_ENCODERS[field]
+        getter = attrgetter(field)
+        parts.append(('[' if index == 0 else ',[') + ','.join([encode(getter(record)) for record in records]) + ']')
+    parts.append(']}')
+
+def dump_transactions(records, fields=TRANSACTION_FIELDS):
+    """Write a list of Transaction records as a JSON array of objects."""
+    parts = []
+    write_transactions(parts, records, fields)
+    return ''.join(parts)
@@ -0,0 +1,559 @@
+"""
+MTN MoMo Transaction Analysis - Approximate Analytics Sketches
+
+This module provides small, mergeable streaming sketches that let the dashboard
+answer exploratory questions without scanning the full transactions table:
+- HyperLogLog for distinct phone numbers and counterparties
+- t-digest for amount percentiles (median, p95, p99)
+- Count-min sketch with a top-k list for heavy-hitter counterparties
+
+Sketches are kept per day and per transaction type, filled in while an XML file
+is ingested, stored in the transaction_sketches table and merged on demand for
+any date range. Monthly rollups of the same buckets are stored in the
+transaction_sketches_monthly table, so a long range merges one bucket per
+month plus the leftover days at either end instead of one bucket per day.
+Small buckets are stored compactly (sparse HyperLogLog registers, exact
+counts instead of a count-min table, raw amounts instead of centroids).
+"""
+
+import math
+import json
+import base64
+import hashlib
+import logging
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+def _hash64(value):
+    """
+    Return a stable 64-bit hash for a value.
+    Python's built-in hash() is randomised per process, so it can't be used for
+    sketches that are saved to the database and merged later.
+    """
+    digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+class HyperLogLog:
+    """
+    Estimate the number of distinct values seen using 2^precision small registers.
+    The standard error of the estimate is 1.04 / sqrt(2^precision).
+
+    Most daily buckets only see a handful of values, so the sketch starts sparse
+    (a dict of the non-zero registers) and switches to the dense register array
+    once more than 1/8 of the registers are set.
+    """
+
+    def __init__(self, precision=11, registers=None, sparse=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.sparse_limit = self.size // 8
+        if registers is not None:
+            self.registers = bytearray(registers)
+            self.sparse = None
+        else:
+            self.registers = None
+            self.sparse = dict(sparse) if sparse else {}
+
+    def add(self, value):
+        """Add a value to the sketch."""
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        # Rank is the position of the leftmost 1-bit in the remaining bits
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if self.sparse is not None:
+            if rank > self.sparse.get(index, 0):
+                self.sparse[index] = rank
+                if len(self.sparse) > self.sparse_limit:
+                    self._densify()
+        elif rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def _densify(self):
+        """Switch from the sparse dict to the dense register array."""
+        self.registers = bytearray(self.size)
+        for index, rank in self.sparse.items():
+            self.registers[index] = rank
+        self.sparse = None
+
+    def merge(self, other):
+        """Merge another sketch with the same precision into this one."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        if other.sparse is not None:
+            # Only the other sketch's non-zero registers need to be visited
+            if self.sparse is not None:
+                for index, rank in other.sparse.items():
+                    if rank > self.sparse.get(index, 0):
+                        self.sparse[index] = rank
+                if len(self.sparse) > self.sparse_limit:
+                    self._densify()
+            else:
+                for index, rank in other.sparse.items():
+                    if rank > self.registers[index]:
+                        self.registers[index] = rank
+        else:
+            if self.sparse is not None:
+                self._densify()
+            self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self):
+        """Return the estimated number of distinct values."""
+        if self.sparse is not None:
+            nonzero = self.sparse.values()
+            zero_registers = self.size - len(self.sparse)
+        else:
+            nonzero = [register for register in self.registers if register]
+            zero_registers = self.size - len(nonzero)
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        harmonic_sum = zero_registers + sum(2.0 ** -register for register in nonzero)
+        raw_estimate = alpha * self.size * self.size / harmonic_sum
+        # Use linear counting for small cardinalities where HLL is biased
+        if raw_estimate <= 2.5 * self.size and zero_registers:
+            return self.size * math.log(self.size / zero_registers)
+        return raw_estimate
+
+    def relative_error(self):
+        """Return the standard error of the estimate as a fraction."""
+        return 1.04 / math.sqrt(self.size)
+
+    def to_dict(self):
+        if self.sparse is not None:
+            # [index, rank] pairs; a few bytes each instead of the full 2^precision registers
+            return {'precision': self.precision, 'sparse': sorted(self.sparse.items())}
+        return {
+            'precision': self.precision,
+            'registers': base64.b64encode(bytes(self.registers)).decode('ascii')
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if 'sparse' in data:
+            return cls(data['precision'], sparse=data['sparse'])
+        return cls(data['precision'], base64.b64decode(data['registers']))
+
+class TDigest:
+    """
+    Estimate quantiles of a stream of numbers by keeping a bounded list of
+    weighted centroids. Centroids are small near the tails, so p95/p99 stay
+    accurate while the median has a rank error of at most pi / (2 * compression).
+    """
+
+    def __init__(self, compression=100, centroids=None):
+        self.compression = compression
+        self.centroids = [list(c) for c in centroids] if centroids else []
+        self.buffer = []
+
+    def add(self, value, weight=1):
+        """Add a value to the digest."""
+        self.buffer.append([float(value), weight])
+        if len(self.buffer) >= self.compression * 5:
+            self._compress()
+
+    def merge(self, other):
+        """
+        Merge another digest into this one. Its centroids are buffered like added
+        values, so merging many small digests only compresses every few hundred points.
+        """
+        self.buffer.extend([list(c) for c in other.centroids])
+        self.buffer.extend([list(c) for c in other.buffer])
+        if len(self.buffer) >= self.compression * 5:
+            self._compress()
+
+    def count(self):
+        return sum(c[1] for c in self.centroids) + sum(c[1] for c in self.buffer)
+
+    def _scale(self, q):
+        """The k1 scale function used to bound centroid sizes."""
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _compress(self):
+        """Merge buffered values into the centroid list."""
+        if not self.buffer:
+            return
+        points = sorted(self.centroids + self.buffer, key=lambda c: c[0])
+        self.buffer = []
+        total = sum(c[1] for c in points)
+        merged = [list(points[0])]
+        weight_so_far = 0
+        k_lower = self._scale(0)
+        for mean, weight in points[1:]:
+            current = merged[-1]
+            q_upper = (weight_so_far + current[1] + weight) / total
+            if self._scale(q_upper) - k_lower <= 1:
+                # Fold the point into the current centroid (weighted mean)
+                current[0] += (mean - current[0]) * weight / (current[1] + weight)
+                current[1] += weight
+            else:
+                weight_so_far += current[1]
+                k_lower = self._scale(weight_so_far / total)
+                merged.append([mean, weight])
+        self.centroids = merged
+
+    def quantile(self, q):
+        """Return the estimated value at quantile q (0 <= q <= 1), or None if empty."""
+        self._compress()
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+        total = sum(c[1] for c in self.centroids)
+        target = q * total
+        cumulative = 0
+        for i, (mean, weight) in enumerate(self.centroids):
+            center = cumulative + weight / 2
+            if target <= center:
+                if i == 0:
+                    return mean
+                prev_mean, prev_weight = self.centroids[i - 1]
+                prev_center = cumulative - prev_weight / 2
+                fraction = (target - prev_center) / (center - prev_center)
+                return prev_mean + (mean - prev_mean) * fraction
+            cumulative += weight
+        return self.centroids[-1][0]
+
+    def rank_error(self):
+        """Return the worst-case rank error of a quantile estimate (at the median)."""
+        return math.pi / (2 * self.compression)
+
+    def to_dict(self):
+        self._compress()
+        if all(weight == 1 for mean, weight in self.centroids):
+            # Small digests where every centroid is one value are stored as the raw values
+            return {'compression': self.compression, 'values': [mean for mean, weight in self.centroids]}
+        return {'compression': self.compression, 'centroids': self.centroids}
+
+    @classmethod
+    def from_dict(cls, data):
+        if 'values' in data:
+            return cls(data['compression'], [[value, 1] for value in data['values']])
+        return cls(data['compression'], data['centroids'])
+
+class CountMinTopK:
+    """
+    Track approximate counts of values with a count-min sketch and keep the k
+    most frequent ones. Counts are never under-estimated; with probability
+    1 - delta they are over-estimated by at most epsilon * total.
+
+    While at most exact_limit distinct values have been seen, exact counts are
+    kept instead of the width x depth table; most daily buckets never need the table.
+    """
+
+    def __init__(self, width=272, depth=5, k=10, table=None, top=None, total=0, counts=None, exact_limit=100):
+        self.width = width
+        self.depth = depth
+        self.k = k
+        self.exact_limit = exact_limit
+        self.total = total
+        if table:
+            self.table = [list(row) for row in table]
+            self.counts = None
+            self.top = dict(top) if top else {}
+        else:
+            self.table = None
+            self.counts = dict(counts) if counts else {}
+            self.top = {}
+
+    def is_exact(self):
+        """True while exact counts are kept (no count-min table yet)."""
+        return self.counts is not None
+
+    def _positions(self, value):
+        # An independent 32-bit hash per row; positions derived from one pair of hashes
+        # (first + row * second) collide in every row together for some pairs of values
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[4 * row:4 * row + 4], 'big') % self.width for row in range(self.depth)]
+
+    def _add_to_table(self, value, count):
+        positions = self._positions(value)
+        for row, position in enumerate(positions):
+            self.table[row][position] += count
+        return min(self.table[row][position] for row, position in enumerate(positions))
+
+    def _use_table(self):
+        """Move the exact counts into a count-min table once there are too many values."""
+        counts = self.counts
+        self.table = [[0] * self.width for _ in range(self.depth)]
+        self.counts = None
+        for value, count in counts.items():
+            self._add_to_table(value, count)
+        largest = sorted(counts, key=counts.get, reverse=True)[:self.k]
+        self.top = {value: self.estimate(value) for value in largest}
+
+    def add(self, value, count=1):
+        """Count a value and update the top-k list."""
+        self.total += count
+        if self.counts is not None:
+            self.counts[value] = self.counts.get(value, 0) + count
+            if len(self.counts) > self.exact_limit:
+                self._use_table()
+            return
+        self.top[value] = self._add_to_table(value, count)
+        self._trim()
+
+    def estimate(self, value):
+        """Return the estimated count for a value."""
+        if self.counts is not None:
+            return self.counts.get(value, 0)
+        return min(self.table[row][position] for row, position in enumerate(self._positions(value)))
+
+    def merge(self, other):
+        """Merge another sketch with the same dimensions into this one."""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge count-min sketches with different dimensions")
+        if other.counts is not None:
+            if self.counts is not None:
+                for value, count in other.counts.items():
+                    self.counts[value] = self.counts.get(value, 0) + count
+                self.total += other.total
+                if len(self.counts) > self.exact_limit:
+                    self._use_table()
+                return
+            # Values the other sketch didn't see keep their (still valid) estimates, so only its values are re-estimated
+            for value, count in other.counts.items():
+                self.top[value] = self._add_to_table(value, count)
+            self.total += other.total
+            self._trim()
+            return
+        if self.counts is not None:
+            self._use_table()
+        for row in range(self.depth):
+            self.table[row] = [a + b for a, b in zip(self.table[row], other.table[row])]
+        self.total += other.total
+        # Candidates from both sides are re-estimated against the merged table
+        candidates = set(self.top) | set(other.top)
+        self.top = {value: self.estimate(value) for value in candidates}
+        self._trim()
+
+    def _trim(self):
+        if len(self.top) > self.k:
+            keep = sorted(self.top.items(), key=lambda item: item[1], reverse=True)[:self.k]
+            self.top = dict(keep)
+
+    def epsilon(self):
+        return math.e / self.width
+
+    def delta(self):
+        return math.exp(-self.depth)
+
+    def max_overcount(self):
+        """Return the most a reported count can exceed the true count (0 while counts are exact)."""
+        if self.counts is not None:
+            return 0
+        return math.ceil(self.epsilon() * self.total)
+
+    def heavy_hitters(self):
+        """Return (value, estimated count) pairs, most frequent first."""
+        if self.counts is not None:
+            return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:self.k]
+        return sorted(self.top.items(), key=lambda item: item[1], reverse=True)
+
+    def to_dict(self):
+        data = {'width': self.width, 'depth': self.depth, 'k': self.k, 'total': self.total}
+        if self.counts is not None:
+            data['counts'] = self.counts
+        else:
+            data['table'] = self.table
+            data['top'] = self.top
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['width'], data['depth'], data['k'], data.get('table'), data.get('top'),
+                   data['total'], data.get('counts'))
+
+class TransactionSketch:
+    """
+    The set of sketches kept for one (day, transaction type) bucket.
+    """
+
+    def __init__(self, phone_numbers=None, counterparties=None, amounts=None, top_counterparties=None, count=0):
+        self.phone_numbers = phone_numbers or HyperLogLog()
+        self.counterparties = counterparties or HyperLogLog()
+        self.amounts = amounts or TDigest()
+        self.top_counterparties = top_counterparties or CountMinTopK()
+        self.count = count
+
+    def add(self, transaction):
+        """Add a processed Transaction (as returned by process_sms) to the sketches."""
+        self.count += 1
+        if transaction.phone_number:
+            self.phone_numbers.add(transaction.phone_number)
+        for counterparty in (transaction.sender, transaction.recipient):
+            if counterparty:
+                self.counterparties.add(counterparty)
+                self.top_counterparties.add(counterparty)
+        if transaction.amount > 0:
+            self.amounts.add(transaction.amount)
+
+    def merge(self, other):
+        """Merge another bucket's sketches into this one."""
+        self.phone_numbers.merge(other.phone_numbers)
+        self.counterparties.merge(other.counterparties)
+        self.amounts.merge(other.amounts)
+        self.top_counterparties.merge(other.top_counterparties)
+        self.count += other.count
+
+    def to_json(self):
+        return json.dumps({
+            'phone_numbers': self.phone_numbers.to_dict(),
+            'counterparties': self.counterparties.to_dict(),
+            'amounts': self.amounts.to_dict(),
+            'top_counterparties': self.top_counterparties.to_dict()
+        })
+
+    @classmethod
+    def from_json(cls, payload, count):
+        data = json.loads(payload)
+        return cls(
+            HyperLogLog.from_dict(data['phone_numbers']),
+            HyperLogLog.from_dict(data['counterparties']),
+            TDigest.from_dict(data['amounts']),
+            CountMinTopK.from_dict(data['top_counterparties']),
+            count
+        )
+
+    def summary(self):
+        """
+        Build the approximate summary for this (possibly merged) bucket,
+        reporting error bounds next to every estimate.
+        """
+        amount_count = self.amounts.count()
+        rank_error = self.amounts.rank_error()
+        return {
+            'distinct_phone_numbers': {
+                'estimate': round(self.phone_numbers.estimate()),
+                'relative_error': round(self.phone_numbers.relative_error(), 4)
+            },
+            'distinct_counterparties': {
+                'estimate': round(self.counterparties.estimate()),
+                'relative_error': round(self.counterparties.relative_error(), 4)
+            },
+            'amount_percentiles': {
+                'p50': self.amounts.quantile(0.5),
+                'p95': self.amounts.quantile(0.95),
+                'p99': self.amounts.quantile(0.99),
+                'rank_error': round(rank_error, 4),
+                'sample_count': amount_count
+            },
+            'top_counterparties': {
+                'items': [
+                    {'counterparty': value, 'count': count}
+                    for value, count in self.top_counterparties.heavy_hitters()
+                ],
+                'max_overcount': self.top_counterparties.max_overcount(),
+                'confidence': round(1 - self.top_counterparties.delta(), 4)
+            }
+        }
+
+def add_to_sketches(sketches, transaction):
+    """
+    Add a transaction to the (day, transaction type) bucket it belongs to,
+    creating the bucket the first time it's seen.
+    """
+    key = (transaction.transaction_date.date(), transaction.transaction_type)
+    if key not in sketches:
+        sketches[key] = TransactionSketch()
+    sketches[key].add(transaction)
+
+def save_sketches(cursor, sketches, table='transaction_sketches'):
+    """
+    Write (or replace) the given buckets in the transaction_sketches table,
+    or in another table with the same columns (e.g. the shadow table used during imports).
+    """
+    sql = f"""
+    REPLACE INTO {table} (
+        sketch_date, transaction_type, transaction_count, payload
+    ) VALUES (
+        %s, %s, %s, %s
+    )
+    """
+    values = [
+        (sketch_date, transaction_type, sketch.count, sketch.to_json())
+        for (sketch_date, transaction_type), sketch in sketches.items()
+    ]
+    if values:
+        cursor.executemany(sql, values)
+    logger.info(f"Saved {len(values)} sketch buckets")
+
+def rollup_by_month(sketches):
+    """
+    Merge (day, transaction type) buckets into (month, transaction type) buckets,
+    keyed by the first day of the month.
+    """
+    monthly = {}
+    for (sketch_date, transaction_type), sketch in sketches.items():
+        key = (sketch_date.replace(day=1), transaction_type)
+        if key not in monthly:
+            monthly[key] = TransactionSketch()
+        monthly[key].merge(sketch)
+    return monthly
+
+def _next_month(day):
+    """Return the first day of the month after the given date."""
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _split_range(start_date, end_date):
+    """
+    Split an inclusive date range (either end may be None for open) into the whole
+    months it covers and the leftover days at either end.
+    Returns (months, day_ranges): months is an inclusive (first month, last month)
+    pair of month start dates, with None for open ends, or None if the range has no
+    whole month; day_ranges is a list of inclusive (start, end) date pairs.
+    """
+    first_month = None
+    if start_date is not None:
+        first_month = start_date if start_date.day == 1 else _next_month(start_date)
+    # Months starting before end_month end on or before end_date
+    end_month = None
+    if end_date is not None:
+        end_month = (end_date + timedelta(days=1)).replace(day=1)
+    if first_month is not None and end_month is not None and first_month >= end_month:
+        return None, [(start_date, end_date)]
+    day_ranges = []
+    if start_date is not None and start_date < first_month:
+        day_ranges.append((start_date, first_month - timedelta(days=1)))
+    if end_date is not None and end_month <= end_date:
+        day_ranges.append((end_month, end_date))
+    last_month = None if end_month is None else (end_month - timedelta(days=1)).replace(day=1)
+    return (first_month, last_month), day_ranges
+
+def _fetch_buckets(cursor, table, start_date, end_date, transaction_type):
+    """Return the (transaction_count, payload) rows of a sketch table between two inclusive dates."""
+    query = f"SELECT transaction_count, payload FROM {table} WHERE 1=1"
+    params = []
+    if transaction_type:
+        query += " AND transaction_type = %s"
+        params.append(transaction_type)
+    if start_date is not None:
+        query += " AND sketch_date >= %s"
+        params.append(start_date)
+    if end_date is not None:
+        query += " AND sketch_date <= %s"
+        params.append(end_date)
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+def load_merged_sketch(cursor, start_date=None, end_date=None, transaction_type=None):
+    """
+    Load the sketch buckets matching the filters and merge them into one.
+    Whole months in the range are read from the monthly rollups and the remaining
+    days from the daily buckets. Dates may be date objects or 'YYYY-MM-DD' strings.
+    Returns a tuple (merged TransactionSketch, number of buckets merged).
+    Raises ValueError if a date string is invalid.
+    """
+    if isinstance(start_date, str):
+        start_date = date.fromisoformat(start_date)
+    if isinstance(end_date, str):
+        end_date = date.fromisoformat(end_date)
+    months, day_ranges = _split_range(start_date, end_date)
+    rows = []
+    if months is not None:
+        rows.extend(_fetch_buckets(cursor, 'transaction_sketches_monthly', *months, transaction_type))
+    for day_range in day_ranges:
+        rows.extend(_fetch_buckets(cursor, 'transaction_sketches', *day_range, transaction_type))
+    merged = TransactionSketch()
+    for transaction_count, payload in rows:
+        merged.merge(TransactionSketch.from_json(payload, transaction_count))
+    return merged, len(rows)
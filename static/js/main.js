@@ -1,11 +1,21 @@
 // Global variables for pagination
 let currentPage = 1;
 const itemsPerPage = 10;
+// The table only needs these columns, so the message text isn't downloaded for every row
+const tableFields = 'transaction_id,transaction_type,amount,sender,recipient,transaction_date';
 let totalItems = 0;
 let retryCount = 0;
 const maxRetries = 3;
 let justCleared = false;
 
+// Global variables for the server-sent events channel
+let eventSource = null;
+let dataGeneration = null;
+let dashboardStale = false;
+// Set while this dashboard's own upload or truncate is in flight, so the
+// data_changed event it causes shows the first page like a full reload would
+let localChangePending = false;
+
 // Global variables for charts
 let typeChart = null;
 let volumeChart = null;
@@ -45,6 +55,9 @@ $(document).ready(function() {
         }
     });
 
+    // Listen for data changes pushed by the server
+    connectEvents();
+
     // Add a small delay before loading data to ensure database is ready
     setTimeout(function() {
         loadInitialData();
@@ -53,8 +66,7 @@ $(document).ready(function() {
     // Set up event listeners for all filter and search controls
     $('#applyFilters').click(function() {
         currentPage = 1;
-        loadTransactions();
-        loadSummary();
+        loadDashboard();
     });
 
     $('#searchTerm').on('keyup', function(e) {
@@ -105,6 +117,7 @@ $(document).ready(function() {
         formData.append('file', file);
         const statusSpan = $('#uploadStatus');
         statusSpan.text('Uploading and processing...');
+        localChangePending = true;
         // Send the file to the backend for processing
         $.ajax({
             url: '/upload',
@@ -116,12 +129,12 @@ $(document).ready(function() {
                 statusSpan.text('File processed successfully!');
                 statusSpan.removeClass('text-danger').addClass('text-success');
                 currentPage = 1;
-                loadTransactions();
-                loadSummary();
+                reloadAfterLocalChange(response.generation);
                 fileInput.value = '';
                 setTimeout(() => statusSpan.text(''), 3000);
             },
             error: function(xhr) {
+                localChangePending = false;
                 const error = xhr.responseJSON ? xhr.responseJSON.error : 'Upload failed';
                 statusSpan.text(error);
                 statusSpan.removeClass('text-success').addClass('text-danger');
@@ -142,6 +155,7 @@ $(document).ready(function() {
 
     // Handle confirmation in the modal to clear all transactions
     $('#confirmClearBtn').on('click', function() {
+        localChangePending = true;
         $.ajax({
             url: '/api/truncate',
             type: 'POST',
@@ -149,11 +163,11 @@ $(document).ready(function() {
                 $('#clearTransactionsModal').modal('hide');
                 currentPage = 1;
                 justCleared = true;
-                loadTransactions();
-                loadSummary();
+                reloadAfterLocalChange(response.generation);
                 showClearNotification('All transactions cleared', 'blue');
             },
             error: function(xhr) {
+                localChangePending = false;
                 $('#clearTransactionsModal').modal('hide');
                 const error = xhr.responseJSON ? xhr.responseJSON.error : 'Failed to clear transactions';
                 showClearNotification(error, 'red');
@@ -184,44 +198,20 @@ function loadInitialData() {
     loadDataWithRetry();
 }
 
-// Try to load summary data, and retry a few times if it fails (e.g., backend is still starting)
+// Try to load the dashboard, and retry a few times if it fails (e.g., backend is still starting)
 function loadDataWithRetry() {
-    // First try to load summary data
+    // Summary, chart data and the first page of transactions come back in one request
     $.ajax({
-        url: '/api/summary',
+        url: '/api/dashboard',
         method: 'GET',
+        data: { page: 1, per_page: itemsPerPage, fields: tableFields, format: 'columnar' },
         timeout: 5000
-    }).then(function(summaryResponse) {
-        if (summaryResponse && typeof summaryResponse === 'object') {
-            // Update summary data
-            $('#totalTransactions').text(summaryResponse.total_transactions.toLocaleString());
-            $('#totalVolume').text(formatAmount(summaryResponse.total_volume) + ' RWF');
-            $('#avgTransactionAmount').text(formatAmount(summaryResponse.statistics.avg_amount) + ' RWF');
-            $('#largestTransaction').text(formatAmount(summaryResponse.statistics.max_amount) + ' RWF');
-            $('#totalFees').text(formatAmount(summaryResponse.statistics.total_fees) + ' RWF');
-            if (summaryResponse.statistics.most_active_day) {
-                $('#mostActiveDay').text(moment(summaryResponse.statistics.most_active_day).format('MMM D, YYYY'));
-            } else {
-                $('#mostActiveDay').text('-');
-            }
-            updateCharts(summaryResponse);
-        }
-        
-        // Then load transactions
-        return $.ajax({
-            url: '/api/transactions',
-            method: 'GET',
-            data: { page: 1, per_page: itemsPerPage },
-            timeout: 5000
-        });
-    }).then(function(transactionsResponse) {
-        if (transactionsResponse && typeof transactionsResponse === 'object') {
-            totalItems = transactionsResponse.total || 0;
-            updateTransactionsTable(transactionsResponse.transactions || []);
-            updatePagination();
-        }
+    }).then(function(dashboardResponse) {
+        applyDashboard(dashboardResponse);
     }).fail(function(jqXHR, textStatus, errorThrown) {
         console.error('Error loading data:', textStatus, errorThrown);
+        // Also reload when the event stream (re)connects, whichever comes first
+        dashboardStale = true;
         
         if (retryCount < maxRetries) {
             retryCount++;
@@ -233,6 +223,120 @@ function loadDataWithRetry() {
     });
 }
 
+// Reload the summary, charts and current transactions page in a single request
+function loadDashboard() {
+    const filters = getFilters();
+    filters.page = currentPage;
+    filters.per_page = itemsPerPage;
+    filters.fields = tableFields;
+    filters.format = 'columnar';
+    showLoadingState();
+
+    $.ajax({
+        url: '/api/dashboard',
+        method: 'GET',
+        data: filters,
+        success: function(data) {
+            applyDashboard(data);
+        },
+        error: function(xhr, status, error) {
+            console.error('Error loading dashboard:', error);
+            showErrorState();
+            $('#transactionsTable').html(`
+                <tr>
+                    <td colspan="6" class="text-center">Error loading transactions. Please try again.</td>
+                </tr>
+            `);
+        }
+    });
+}
+
+// Update the summary cards, charts and transactions table from a /api/dashboard response
+function applyDashboard(data) {
+    dashboardStale = false;
+    if (data && data.generation !== undefined) {
+        dataGeneration = data.generation;
+    }
+    if (data && data.summary) {
+        updateSummaryCards(data.summary);
+    }
+    if (data && data.page) {
+        totalItems = data.page.total || 0;
+        updateTransactionsTable(pageTransactions(data.page));
+        updatePagination();
+    }
+}
+
+// Connect to the server-sent events stream so uploads and truncates
+// (from this or any other dashboard) update the page without polling
+function connectEvents() {
+    if (!window.EventSource) {
+        return;
+    }
+    eventSource = new EventSource('/api/events');
+
+    // Sent on every (re)connect: reload if we missed a change or never loaded
+    eventSource.addEventListener('hello', function(e) {
+        const data = JSON.parse(e.data);
+        if (dashboardStale || (dataGeneration !== null && data.generation !== dataGeneration)) {
+            loadDashboard();
+        }
+    });
+
+    eventSource.addEventListener('ingest_progress', function(e) {
+        const data = JSON.parse(e.data);
+        $('#uploadStatus')
+            .removeClass('text-danger text-success')
+            .text(`Processing ${data.filename}: ${data.processed.toLocaleString()} transactions from ${data.total_messages.toLocaleString()} messages...`);
+    });
+
+    eventSource.addEventListener('ingest_failed', function(e) {
+        const data = JSON.parse(e.data);
+        console.error('Ingest failed:', data.error);
+    });
+
+    // The fresh summary comes with the event, so only the current page needs to be fetched.
+    // The event can arrive before the upload/truncate response, so the page is reset here.
+    eventSource.addEventListener('data_changed', function(e) {
+        const data = JSON.parse(e.data);
+        dataGeneration = data.generation;
+        if (localChangePending) {
+            localChangePending = false;
+            currentPage = 1;
+            justCleared = data.reason === 'truncate';
+        }
+        // The summary is left out if the server couldn't load it; reload everything then
+        if (!data.summary) {
+            loadDashboard();
+            return;
+        }
+        updateSummaryCards(data.summary);
+        loadTransactions(true);
+    });
+}
+
+// After this dashboard's own upload or truncate, the data_changed push normally
+// reloads the page. Reload it here if we aren't listening, or if the push for the
+// new generation hasn't arrived shortly after the response (pushes can be dropped).
+function reloadAfterLocalChange(generation) {
+    if (!eventsConnected()) {
+        localChangePending = false;
+        loadDashboard();
+        return;
+    }
+    setTimeout(function() {
+        if (dataGeneration === null || dataGeneration < generation) {
+            localChangePending = false;
+            loadDashboard();
+        }
+    }, 1000);
+}
+
+// True when the event stream is open and will deliver data changes
+function eventsConnected() {
+    return eventSource !== null && eventSource.readyState === EventSource.OPEN;
+}
+
 // Show zero state for all summary cards
 function showZeroState() {
     $('#totalTransactions').text('0');
@@ -248,11 +352,14 @@ function showZeroState() {
     `);
 }
 
-// Load transactions with filters
-function loadTransactions() {
+// Load transactions with filters.
+// With clampPage (after a data change), a page past the new last page is replaced by the last page.
+function loadTransactions(clampPage) {
     const filters = getFilters();
     filters.page = currentPage;
     filters.per_page = itemsPerPage;
+    filters.fields = tableFields;
+    filters.format = 'columnar';
     
     $.ajax({
         url: '/api/transactions',
@@ -260,8 +367,13 @@ function loadTransactions() {
         data: filters,
         success: function(data) {
             if (data && typeof data === 'object') {
+                if (clampPage && data.total_pages > 0 && currentPage > data.total_pages) {
+                    currentPage = data.total_pages;
+                    loadTransactions();
+                    return;
+                }
                 totalItems = data.total || 0;
-                const transactions = data.transactions || [];
+                const transactions = pageTransactions(data);
                 updateTransactionsTable(transactions);
                 updatePagination();
                 
@@ -294,51 +406,6 @@ function loadTransactions() {
     });
 }
 
-// Load summary data
-function loadSummary() {
-    // Show loading state
-    $('#totalTransactions').text('Loading...');
-    $('#totalVolume').text('Loading...');
-    $('#avgTransactionAmount').text('Loading...');
-    $('#largestTransaction').text('Loading...');
-    $('#totalFees').text('Loading...');
-    $('#mostActiveDay').text('Loading...');
-
-    $.ajax({
-        url: '/api/summary',
-        method: 'GET',
-        success: function(data) {
-            if (data && typeof data === 'object') {
-                // Format numbers with commas
-                $('#totalTransactions').text(data.total_transactions.toLocaleString());
-                $('#totalVolume').text(formatAmount(data.total_volume) + ' RWF');
-                
-                // Update statistics with proper formatting
-                $('#avgTransactionAmount').text(formatAmount(data.statistics.avg_amount) + ' RWF');
-                $('#largestTransaction').text(formatAmount(data.statistics.max_amount) + ' RWF');
-                $('#totalFees').text(formatAmount(data.statistics.total_fees) + ' RWF');
-                
-                // Format the date
-                if (data.statistics.most_active_day) {
-                    $('#mostActiveDay').text(moment(data.statistics.most_active_day).format('MMM D, YYYY'));
-                } else {
-                    $('#mostActiveDay').text('-');
-                }
-                
-                // Update charts
-                updateCharts(data);
-            } else {
-                console.error('Invalid summary response format:', data);
-                showErrorState();
-            }
-        },
-        error: function(xhr, status, error) {
-            console.error('Error loading summary:', error);
-            showErrorState();
-        }
-    });
-}
-
 // Show error state for summary cards
 function showErrorState() {
     $('#totalTransactions').text('0');
@@ -349,6 +416,29 @@ function showErrorState() {
     $('#mostActiveDay').text('-');
 }
 
+// Get the transactions of a page response as an array of objects,
+// expanding the columnar format ({fields, columns}) if that was requested
+function pageTransactions(page) {
+    if (!page.transactions) {
+        return [];
+    }
+    if (page.format !== 'columnar') {
+        return page.transactions;
+    }
+    const fields = page.transactions.fields;
+    const columns = page.transactions.columns;
+    const count = columns.length ? columns[0].length : 0;
+    const transactions = [];
+    for (let i = 0; i < count; i++) {
+        const transaction = {};
+        fields.forEach((field, j) => {
+            transaction[field] = columns[j][i];
+        });
+        transactions.push(transaction);
+    }
+    return transactions;
+}
+
 // Get current filter values
 function getFilters() {
     const dateRange = $('#dateRange').data('daterangepicker');
@@ -472,7 +562,11 @@ function updateSummaryCards(data) {
     $('#avgTransactionAmount').text(formatAmount(data.statistics.avg_amount) + ' RWF');
     $('#largestTransaction').text(formatAmount(data.statistics.max_amount) + ' RWF');
     $('#totalFees').text(formatAmount(data.statistics.total_fees) + ' RWF');
-    $('#mostActiveDay').text(moment(data.statistics.most_active_day).format('MMM D, YYYY'));
+    if (data.statistics.most_active_day) {
+        $('#mostActiveDay').text(moment(data.statistics.most_active_day).format('MMM D, YYYY'));
+    } else {
+        $('#mostActiveDay').text('-');
+    }
     
     updateCharts(data);
 }
@@ -0,0 +1,119 @@
+"""
+Tests for the on-disk SMS parse cache in scripts/parse_cache.py: parser-version
+invalidation, least recently used eviction, prefetching and the hit/miss report.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from scripts import parse_cache
+from scripts.parse_cache import ParseCache
+from scripts.records import Transaction
+
+def make_body(number):
+    return (f"TxId: {73214484437 + number}. Your payment of {1000 + number:,} RWF to Jane Smith 12845 "
+            f"has been completed at 2024-05-10 16:31:39. Your new balance: 1,000 RWF. Fee was 0 RWF.")
+
+def make_transaction(number, body):
+    return Transaction(
+        transaction_id=str(73214484437 + number),
+        transaction_type='payment',
+        amount=1000 + number,
+        fee=0,
+        sender=None,
+        recipient='Jane Smith',
+        phone_number=None,
+        transaction_date=datetime(2024, 5, 10, 16, 31, 39),
+        balance=1000,
+        message=body
+    )
+
+class ParseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache', 'parse_cache.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_import(self, numbers, parser_version='v1', max_entries=1000, prefetch=True):
+        """Look up and store the given messages like process_xml_file does; returns the cache's report."""
+        cache = ParseCache(parser_version, path=self.path, max_entries=max_entries)
+        bodies = [make_body(number) for number in numbers]
+        if prefetch:
+            cache.prefetch(bodies)
+        for number, body in zip(numbers, bodies):
+            found, transaction = cache.get(body)
+            if found:
+                self.assertEqual(transaction.transaction_id, str(73214484437 + number))
+                self.assertEqual(transaction.message, body)
+            else:
+                cache.put(body, make_transaction(number, body))
+        cache.close()
+        return cache.report()
+
+    def test_results_are_reused_across_runs(self):
+        self.assertEqual(self.run_import(range(10))['misses'], 10)
+        report = self.run_import(range(5, 15))
+        self.assertEqual((report['hits'], report['misses'], report['hit_rate']), (5, 5, 0.5))
+
+    def test_cached_result_round_trips(self):
+        body = make_body(1)
+        expected = make_transaction(1, body)
+        cache = ParseCache('v1', path=self.path)
+        cache.put(body, expected)
+        cache.put('Not a transaction', None)
+        cache.close()
+        cache = ParseCache('v1', path=self.path)
+        found, transaction = cache.get(body)
+        self.assertTrue(found)
+        for field in Transaction.__slots__:
+            self.assertEqual(getattr(transaction, field), getattr(expected, field))
+        self.assertEqual(cache.get('Not a transaction'), (True, None))
+        self.assertEqual(cache.get('Never seen'), (False, None))
+        cache.close()
+
+    def test_changed_parser_version_empties_the_cache(self):
+        self.run_import(range(10), parser_version='v1')
+        report = self.run_import(range(10), parser_version='v2')
+        self.assertEqual((report['hits'], report['misses']), (0, 10))
+        # The old version's results are gone too, not just unused
+        report = self.run_import(range(10), parser_version='v1')
+        self.assertEqual(report['hits'], 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.run_import(range(0, 10))
+        self.run_import(range(10, 20))
+        # Using 0-4 again makes 5-9 the least recently used entries
+        self.run_import(range(0, 5))
+        report = self.run_import(range(20, 25), max_entries=20)
+        self.assertEqual(report['evicted'], 5)
+        self.assertEqual(self.run_import(range(0, 5))['hits'], 5)
+        self.assertEqual(self.run_import(range(10, 25))['hits'], 15)
+        self.assertEqual(self.run_import(range(5, 10))['hits'], 0)
+
+    def test_repeated_body_within_one_run_is_a_hit(self):
+        report = self.run_import([1, 2, 1, 3, 1])
+        self.assertEqual((report['hits'], report['misses']), (2, 3))
+
+    def test_prefetch_is_batched(self):
+        # More keys than one IN (...) query takes
+        count = parse_cache.PREFETCH_BATCH_SIZE * 2 + 7
+        self.run_import(range(count), max_entries=count)
+        report = self.run_import(range(count), max_entries=count)
+        self.assertEqual((report['hits'], report['misses']), (count, 0))
+
+    def test_lookups_without_prefetch(self):
+        self.run_import(range(5), prefetch=False)
+        report = self.run_import(range(3, 8), prefetch=False)
+        self.assertEqual((report['hits'], report['misses']), (2, 3))
+
+    def test_empty_report(self):
+        self.assertEqual(self.run_import([]), {'hits': 0, 'misses': 0, 'hit_rate': 0.0, 'evicted': 0})
+
+if __name__ == '__main__':
+    unittest.main()
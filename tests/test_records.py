@@ -0,0 +1,137 @@
+"""
+Tests for the Transaction record and its JSON serializer in scripts/records.py.
+The API output must stay the same as what jsonify produced for the old
+dictionary rows, so it is compared against app.json.dumps of those rows.
+Also covers the fields= parsing and the column-oriented format.
+"""
+
+import json
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from app import app
+from scripts.records import (
+    INSERT_FIELDS,
+    TRANSACTION_FIELDS,
+    Transaction,
+    dump_transactions,
+    parse_fields,
+    write_transaction_columns
+)
+
+ROWS = [
+    (1, '76662021700', 'incoming_money', Decimal('2000.00'), Decimal('0.00'), 'Jane Smith', None,
+     '*********013', datetime(2024, 5, 10, 16, 30, 51), Decimal('2000.00'),
+     'You have received 2000 RWF from Jane Smith.'),
+    (2, None, 'payment', Decimal('1000.50'), None, None, 'Samuel Carter', None,
+     None, None, None),
+    (3, '73214484437', 'payment', Decimal('15000'), Decimal('100.00'), 'Élodie Müller "EM"', 'Zoë \\ Ngoga',
+     '250788110381', datetime(2025, 1, 16, 9, 5, 0), Decimal('-12.34'),
+     'Line one\nLine two\t"quoted" </script> ₣ \U0001f4b8'),
+]
+
+def old_row(row, fields=TRANSACTION_FIELDS):
+    """Build a row the way the API did before Transaction records: a dict with the date as a string."""
+    transaction = dict(zip(fields, row))
+    if transaction.get('transaction_date'):
+        transaction['transaction_date'] = transaction['transaction_date'].strftime('%Y-%m-%d %H:%M:%S')
+    return transaction
+
+def jsonify_body(data):
+    """The body jsonify writes (compact separators), keeping the keys in column order."""
+    return app.json.dumps(data, sort_keys=False, separators=(',', ':'))
+
+class DumpTransactionsTest(unittest.TestCase):
+
+    def test_matches_jsonify_of_dict_rows(self):
+        records = [Transaction.from_row(row) for row in ROWS]
+        self.assertEqual(dump_transactions(records), jsonify_body([old_row(row) for row in ROWS]))
+
+    def test_projected_fields_match_jsonify_of_dict_rows(self):
+        fields = ('transaction_date', 'amount', 'sender')
+        indexes = [TRANSACTION_FIELDS.index(field) for field in fields]
+        rows = [tuple(row[index] for index in indexes) for row in ROWS]
+        records = [Transaction.from_row(row, fields) for row in rows]
+        self.assertEqual(dump_transactions(records, fields), jsonify_body([old_row(row, fields) for row in rows]))
+
+    def test_empty_list(self):
+        self.assertEqual(dump_transactions([]), '[]')
+
+class ParseFieldsTest(unittest.TestCase):
+
+    def test_missing_or_blank_means_all_fields(self):
+        for value in (None, '', '   '):
+            self.assertIs(parse_fields(value), TRANSACTION_FIELDS)
+
+    def test_keeps_requested_order_and_removes_duplicates(self):
+        self.assertEqual(
+            parse_fields(' amount, transaction_id ,amount,,sender'),
+            ('amount', 'transaction_id', 'sender')
+        )
+
+    def test_unknown_fields_are_rejected(self):
+        with self.assertRaisesRegex(ValueError, 'Unknown fields: secret, password'):
+            parse_fields('amount,secret,password')
+
+    def test_only_separators_are_rejected(self):
+        for value in (',', ' , ', ',,,'):
+            with self.assertRaisesRegex(ValueError, 'No fields given'):
+                parse_fields(value)
+
+class WriteTransactionColumnsTest(unittest.TestCase):
+
+    def columns(self, records, fields=TRANSACTION_FIELDS):
+        parts = []
+        write_transaction_columns(parts, records, fields)
+        return ''.join(parts)
+
+    def test_columns_match_rows(self):
+        records = [Transaction.from_row(row) for row in ROWS]
+        data = json.loads(self.columns(records))
+        self.assertEqual(data['fields'], list(TRANSACTION_FIELDS))
+        self.assertEqual(len(data['columns']), len(TRANSACTION_FIELDS))
+        rows = json.loads(dump_transactions(records))
+        for index, field in enumerate(TRANSACTION_FIELDS):
+            self.assertEqual(data['columns'][index], [row[field] for row in rows])
+
+    def test_projected_columns_follow_field_order(self):
+        records = [Transaction.from_row(row) for row in ROWS]
+        data = json.loads(self.columns(records, ('amount', 'id')))
+        self.assertEqual(data, {'fields': ['amount', 'id'], 'columns': [['2000.00', '1000.50', '15000'], [1, 2, 3]]})
+
+    def test_single_field(self):
+        # attrgetter with a single name returns the value itself rather than a tuple
+        records = [Transaction.from_row(row) for row in ROWS]
+        self.assertEqual(self.columns(records, ('id',)), '{"fields":["id"],"columns":[[1,2,3]]}')
+        self.assertEqual(dump_transactions(records[:2], ('id',)), '[{"id":1},{"id":2}]')
+
+    def test_no_records(self):
+        self.assertEqual(self.columns([], ('id', 'amount')), '{"fields":["id","amount"],"columns":[[],[]]}')
+
+class TransactionTest(unittest.TestCase):
+
+    def test_from_row_with_all_fields(self):
+        record = Transaction.from_row(ROWS[0])
+        for field, value in zip(TRANSACTION_FIELDS, ROWS[0]):
+            self.assertEqual(getattr(record, field), value)
+
+    def test_from_row_with_projected_fields(self):
+        record = Transaction.from_row(('73214484437', Decimal('15000')), ('transaction_id', 'amount'))
+        self.assertEqual(record.transaction_id, '73214484437')
+        self.assertEqual(record.amount, Decimal('15000'))
+        for field in TRANSACTION_FIELDS:
+            if field not in ('transaction_id', 'amount'):
+                self.assertIsNone(getattr(record, field))
+
+    def test_insert_values_follow_insert_fields(self):
+        record = Transaction.from_row(ROWS[2])
+        self.assertEqual(record.insert_values(), ROWS[2][1:])
+        self.assertEqual(len(INSERT_FIELDS), len(record.insert_values()))
+
+    def test_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            Transaction().extra = 1
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,240 @@
+"""
+Tests for the approximate analytics sketches in scripts/sketches.py:
+accuracy against exact answers, merging, and the stored JSON form.
+"""
+
+import json
+import random
+import unittest
+from datetime import date, datetime
+
+from scripts.records import Transaction
+from scripts.sketches import (
+    CountMinTopK,
+    HyperLogLog,
+    TDigest,
+    TransactionSketch,
+    _split_range,
+    rollup_by_month
+)
+
+def make_transaction(day, amount, sender, recipient, phone_number, transaction_type='payment'):
+    return Transaction(
+        transaction_id=f"{day}-{amount}-{sender}",
+        transaction_type=transaction_type,
+        amount=amount,
+        fee=0,
+        sender=sender,
+        recipient=recipient,
+        phone_number=phone_number,
+        transaction_date=datetime(day.year, day.month, day.day, 12, 0, 0),
+        balance=0,
+        message=''
+    )
+
+class HyperLogLogTest(unittest.TestCase):
+
+    def test_estimate_is_within_error_bound(self):
+        sketch = HyperLogLog()
+        for i in range(20000):
+            sketch.add(f"0788{i:06d}")
+        error = abs(sketch.estimate() - 20000) / 20000
+        self.assertLess(error, 3 * sketch.relative_error())
+
+    def test_small_sketches_stay_sparse_and_count_exactly(self):
+        sketch = HyperLogLog()
+        for i in range(20):
+            sketch.add(f"name {i}")
+            sketch.add(f"name {i}")
+        self.assertIsNotNone(sketch.sparse)
+        self.assertEqual(round(sketch.estimate()), 20)
+
+    def test_sparse_sketch_becomes_dense(self):
+        sketch = HyperLogLog()
+        for i in range(2000):
+            sketch.add(i)
+        self.assertIsNone(sketch.sparse)
+        self.assertEqual(len(sketch.registers), sketch.size)
+
+    def test_merge_matches_sketch_of_union(self):
+        # Sparse into sparse, sparse into dense and dense into sparse
+        for left_count, right_count in ((10, 20), (5000, 30), (30, 5000)):
+            left, right, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+            for i in range(left_count):
+                left.add(f"left {i}")
+                union.add(f"left {i}")
+            for i in range(right_count):
+                right.add(f"right {i}")
+                union.add(f"right {i}")
+            left.merge(right)
+            self.assertEqual(left.estimate(), union.estimate())
+
+    def test_merge_rejects_different_precision(self):
+        with self.assertRaises(ValueError):
+            HyperLogLog(precision=11).merge(HyperLogLog(precision=12))
+
+    def test_json_round_trip(self):
+        for count in (10, 5000):
+            sketch = HyperLogLog()
+            for i in range(count):
+                sketch.add(i)
+            restored = HyperLogLog.from_dict(json.loads(json.dumps(sketch.to_dict())))
+            self.assertEqual(restored.estimate(), sketch.estimate())
+
+class TDigestTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.values = [rng.uniform(100, 100000) for _ in range(20000)]
+
+    def assertQuantilesClose(self, digest, values):
+        ordered = sorted(values)
+        for q in (0.5, 0.95, 0.99):
+            estimate = digest.quantile(q)
+            # Compare ranks, which is what the t-digest error bound is about
+            rank = sum(1 for value in ordered if value <= estimate) / len(ordered)
+            self.assertLess(abs(rank - q), digest.rank_error(), f"quantile {q}")
+
+    def test_quantiles_are_within_rank_error(self):
+        digest = TDigest()
+        for value in self.values:
+            digest.add(value)
+        self.assertQuantilesClose(digest, self.values)
+        self.assertEqual(digest.count(), len(self.values))
+
+    def test_merge_of_many_small_digests(self):
+        merged = TDigest()
+        for start in range(0, len(self.values), 10):
+            part = TDigest()
+            for value in self.values[start:start + 10]:
+                part.add(value)
+            merged.merge(TDigest.from_dict(json.loads(json.dumps(part.to_dict()))))
+        self.assertQuantilesClose(merged, self.values)
+        self.assertEqual(merged.count(), len(self.values))
+
+    def test_small_digest_is_stored_as_raw_values(self):
+        digest = TDigest()
+        for value in (500, 1000, 2500):
+            digest.add(value)
+        data = digest.to_dict()
+        self.assertEqual(data['values'], [500.0, 1000.0, 2500.0])
+        self.assertEqual(TDigest.from_dict(data).quantile(0.5), 1000.0)
+
+    def test_empty_digest(self):
+        self.assertIsNone(TDigest().quantile(0.5))
+
+class CountMinTopKTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(11)
+        # A few heavy hitters among many rare values
+        self.values = [f"heavy {rng.randint(0, 4)}" for _ in range(3000)]
+        self.values += [f"rare {rng.randint(0, 2000)}" for _ in range(3000)]
+        rng.shuffle(self.values)
+        self.counts = {}
+        for value in self.values:
+            self.counts[value] = self.counts.get(value, 0) + 1
+
+    def test_few_values_are_counted_exactly(self):
+        sketch = CountMinTopK()
+        for value in ('a', 'b', 'a', 'c', 'a', 'b'):
+            sketch.add(value)
+        self.assertTrue(sketch.is_exact())
+        self.assertEqual(sketch.heavy_hitters()[:2], [('a', 3), ('b', 2)])
+        self.assertEqual(sketch.max_overcount(), 0)
+
+    def assertHeavyHittersFound(self, sketch):
+        self.assertFalse(sketch.is_exact())
+        found = [value for value, count in sketch.heavy_hitters()[:5]]
+        self.assertEqual(sorted(found), [f"heavy {i}" for i in range(5)])
+        for value, count in sketch.heavy_hitters():
+            # Never under-estimated, and over-estimated by at most epsilon * total
+            self.assertGreaterEqual(count, self.counts[value])
+            self.assertLessEqual(count, self.counts[value] + sketch.max_overcount())
+
+    def test_heavy_hitters(self):
+        sketch = CountMinTopK()
+        for value in self.values:
+            sketch.add(value)
+        self.assertEqual(sketch.total, len(self.values))
+        self.assertHeavyHittersFound(sketch)
+
+    def test_merge_of_exact_and_table_sketches(self):
+        merged = CountMinTopK()
+        for start in range(0, len(self.values), 50):
+            part = CountMinTopK()
+            for value in self.values[start:start + 50]:
+                part.add(value)
+            merged.merge(CountMinTopK.from_dict(json.loads(json.dumps(part.to_dict()))))
+        self.assertEqual(merged.total, len(self.values))
+        self.assertHeavyHittersFound(merged)
+        # A large sketch merged into a small exact one
+        exact = CountMinTopK()
+        exact.add('heavy 0')
+        exact.merge(merged)
+        self.assertHeavyHittersFound(exact)
+
+class TransactionSketchTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(3)
+        self.sketches = {}
+        for day in (date(2024, 5, 30), date(2024, 5, 31), date(2024, 6, 1), date(2024, 6, 15)):
+            sketch = TransactionSketch()
+            for _ in range(20):
+                sketch.add(make_transaction(
+                    day, rng.randint(100, 50000), f"sender {rng.randint(0, 5)}",
+                    f"recipient {rng.randint(0, 5)}", f"0788{rng.randint(0, 50):06d}"
+                ))
+            self.sketches[(day, 'payment')] = sketch
+
+    def test_small_bucket_payload_is_compact(self):
+        payload = self.sketches[(date(2024, 5, 30), 'payment')].to_json()
+        self.assertLess(len(payload), 2000)
+
+    def test_json_round_trip(self):
+        sketch = self.sketches[(date(2024, 6, 1), 'payment')]
+        restored = TransactionSketch.from_json(sketch.to_json(), sketch.count)
+        self.assertEqual(restored.summary(), sketch.summary())
+
+    def test_monthly_rollup_matches_merging_days(self):
+        monthly = rollup_by_month(self.sketches)
+        self.assertEqual(sorted(monthly), [(date(2024, 5, 1), 'payment'), (date(2024, 6, 1), 'payment')])
+        may = TransactionSketch()
+        may.merge(self.sketches[(date(2024, 5, 30), 'payment')])
+        may.merge(self.sketches[(date(2024, 5, 31), 'payment')])
+        self.assertEqual(monthly[(date(2024, 5, 1), 'payment')].summary(), may.summary())
+        self.assertEqual(monthly[(date(2024, 5, 1), 'payment')].count, 40)
+
+class SplitRangeTest(unittest.TestCase):
+
+    def test_whole_months_and_leftover_days(self):
+        months, day_ranges = _split_range(date(2024, 5, 10), date(2025, 1, 16))
+        self.assertEqual(months, (date(2024, 6, 1), date(2024, 12, 1)))
+        self.assertEqual(day_ranges, [
+            (date(2024, 5, 10), date(2024, 5, 31)),
+            (date(2025, 1, 1), date(2025, 1, 16))
+        ])
+
+    def test_exact_month(self):
+        self.assertEqual(_split_range(date(2024, 2, 1), date(2024, 2, 29)), ((date(2024, 2, 1), date(2024, 2, 1)), []))
+
+    def test_range_inside_one_month(self):
+        self.assertEqual(
+            _split_range(date(2024, 5, 3), date(2024, 5, 20)),
+            (None, [(date(2024, 5, 3), date(2024, 5, 20))])
+        )
+
+    def test_open_ends(self):
+        self.assertEqual(_split_range(None, None), ((None, None), []))
+        self.assertEqual(
+            _split_range(None, date(2024, 6, 15)),
+            ((None, date(2024, 5, 1)), [(date(2024, 6, 1), date(2024, 6, 15))])
+        )
+        self.assertEqual(
+            _split_range(date(2024, 12, 15), None),
+            ((date(2025, 1, 1), None), [(date(2024, 12, 15), date(2024, 12, 31))])
+        )
+
+if __name__ == '__main__':
+    unittest.main()